@@ -1,10 +1,24 @@
 import os
+import abc
 import json
+import base64
+import hashlib
+import time
+import queue
+import select
+import sqlite3
+import threading
+import functools
+from itertools import islice
 from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy.orm import contains_eager, validates
 from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.engine import Engine
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
 from flask_cors import CORS
 from datetime import datetime, timezone, timedelta
 import click
@@ -13,43 +27,95 @@ from dotenv import load_dotenv
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Changes-Token'])
 
 # --- Database Configuration ---
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Write JSON as UTF-8 rather than \uXXXX escapes so in-database JSON paths such as
+# '$."受付"' (used by the bulk task updates) match the stored task names
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'json_serializer': lambda obj: json.dumps(obj, ensure_ascii=False)
+}
+
+# Where checkbox state lives: 'json' (monthly_tasks.tasks only), 'dual' (JSON stays
+# authoritative and every write is mirrored into task_statuses) or 'table'
+# (task_statuses is authoritative; run `flask sync-task-statuses` before switching)
+TASK_STATUS_STORAGE = os.environ.get('TASK_STATUS_STORAGE', 'json')
+
+# Where editing sessions (who has a client open) live: 'database', 'memory' or 'sqlite';
+# see the Editing Session Store section
+EDITING_SESSION_STORE = os.environ.get('EDITING_SESSION_STORE', 'database')
+EDITING_SESSION_STORE_PATH = os.environ.get('EDITING_SESSION_STORE_PATH', 'editing_sessions.sqlite3')
+EDITING_SESSION_TTL = timedelta(minutes=int(os.environ.get('EDITING_SESSION_TTL_MINUTES', '10')))
+# Seconds between background purges of expired editing sessions and old deletion tombstones;
+# 0 leaves it to `flask reap-editing-sessions` and `flask prune-deleted-clients`
+EDITING_SESSION_REAPER_INTERVAL = int(os.environ.get('EDITING_SESSION_REAPER_INTERVAL', '0'))
+
+# Fan-out for /api/events: 'postgres' (LISTEN/NOTIFY, reaches every worker) or 'memory'
+# (this process only); defaults to 'postgres' when DATABASE_URL points at PostgreSQL
+EVENT_BROKER = os.environ.get('EVENT_BROKER') or ('postgres' if (DATABASE_URL or '').startswith('postgres') else 'memory')
+# Every open stream holds a worker thread, so each process serves at most EVENT_STREAM_LIMIT
+# of them (the rest get 503) and ends each after EVENT_STREAM_MAX_SECONDS; browsers reconnect.
+# Keep EVENT_STREAM_LIMIT well below gunicorn's --threads so ordinary requests still get a thread.
+EVENT_STREAM_LIMIT = int(os.environ.get('EVENT_STREAM_LIMIT', '8'))
+EVENT_STREAM_MAX_SECONDS = int(os.environ.get('EVENT_STREAM_MAX_SECONDS', '300'))
+
+# Locking for per-client writes on top of the version checks: 'none', 'wait', 'nowait' or
+# 'advisory' (see the Write Locks section). WRITE_LOCK_TIMEOUT_MS > 0 bounds every lock wait
+# of a client data write on PostgreSQL; contended writes get 423 instead of queueing.
+WRITE_LOCK_MODE = os.environ.get('WRITE_LOCK_MODE', 'none')
+WRITE_LOCK_TIMEOUT_MS = int(os.environ.get('WRITE_LOCK_TIMEOUT_MS', '0'))
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 
 # --- Database Models ---
 
+# JSONB on PostgreSQL so task state can be queried and GIN-indexed; plain JSON elsewhere (tests)
+JSONDocument = db.JSON().with_variant(postgresql.JSONB(), 'postgresql')
+
 class Staff(db.Model):
     __tablename__ = 'staffs'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False, unique=True)
     clients = db.relationship('Client', backref='staff', lazy=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
 
     def __repr__(self):
         return f'<Staff {self.name}>'
 
 class Client(db.Model):
     __tablename__ = 'clients'
+    __table_args__ = (
+        db.Index('ix_clients_custom_tasks_by_year', 'custom_tasks_by_year', postgresql_using='gin'),
+        db.Index('ix_clients_finalized_years', 'finalized_years', postgresql_using='gin'),
+        db.Index('uq_clients_idempotency_key', 'idempotency_key', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=False)
     name = db.Column(db.String(255), nullable=False)
-    fiscal_month = db.Column(db.Integer, nullable=False)
-    staff_id = db.Column(db.Integer, db.ForeignKey('staffs.id'), nullable=False)
+    fiscal_month = db.Column(db.Integer, nullable=False, index=True)
+    staff_id = db.Column(db.Integer, db.ForeignKey('staffs.id'), nullable=False, index=True)
     accounting_method = db.Column(db.String(255))
     status = db.Column(db.String(255))
     is_inactive = db.Column(db.Boolean, default=False, nullable=False)
-    custom_tasks_by_year = db.Column(db.JSON, default={})
-    finalized_years = db.Column(db.JSON, default=[])
-    monthly_tasks = db.relationship('MonthlyTask', backref='client', lazy=True, cascade="all, delete-orphan")
+    custom_tasks_by_year = db.Column(JSONDocument, default={})
+    finalized_years = db.Column(JSONDocument, default=[])
+    # Progress summary maintained by refresh_progress_summary() on every write path
+    latest_completed_month = db.Column(db.String(255))
+    latest_completed_month_key = db.Column(db.Integer, index=True)
+    monthly_tasks = db.relationship('MonthlyTask', backref='client', lazy=True, cascade="all, delete-orphan",
+                                    order_by='MonthlyTask.year_month')
+    version = db.Column(db.Integer, nullable=False, server_default='1')  # Bumped on every ORM update
+    idempotency_key = db.Column(db.String(255))  # Idempotency-Key of the POST that created the client
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
 
+    __mapper_args__ = {'version_id_col': version}
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -59,8 +125,9 @@ class Client(db.Model):
             'accounting_method': self.accounting_method,
             'status': self.status,
             'is_inactive': self.is_inactive,
-            'unattendedMonths': 'N/A', # To be calculated later
-            'monthlyProgress': 'N/A', # To be calculated later
+            'unattendedMonths': unattended_months_label(self.latest_completed_month_key),
+            'monthlyProgress': self.latest_completed_month or '未完了',
+            'version': self.version,
             'updated_at': self.updated_at.astimezone(timezone.utc).isoformat() if self.updated_at else None,
             'custom_tasks_by_year': self.custom_tasks_by_year,
             'finalized_years': self.finalized_years
@@ -68,16 +135,25 @@ class Client(db.Model):
 
 class MonthlyTask(db.Model):
     __tablename__ = 'monthly_tasks'
+    __table_args__ = (
+        db.Index('uq_monthly_tasks_client_id_year_month', 'client_id', 'year_month', unique=True),
+        db.Index('ix_monthly_tasks_year_month', 'year_month'),
+        db.Index('ix_monthly_tasks_tasks', 'tasks', postgresql_using='gin'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
-    month = db.Column(db.String(255), nullable=False)
-    tasks = db.Column(db.JSON)
+    month = db.Column(db.String(255), nullable=False)  # Display label, e.g. '2025年4月'
+    year_month = db.Column(db.Integer)  # Sortable YYYYMM key kept in sync with month
+    tasks = db.Column(JSONDocument)
     status = db.Column(db.String(255))
     url = db.Column(db.String(255))
     memo = db.Column(db.Text)
+    version = db.Column(db.Integer, nullable=False, server_default='1')  # Bumped on every ORM update
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
 
+    __mapper_args__ = {'version_id_col': version}
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -86,9 +162,28 @@ class MonthlyTask(db.Model):
             'status': self.status,
             'url': self.url,
             'memo': self.memo,
+            'version': self.version,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+    @validates('month')
+    def validate_month(self, key, month):
+        self.year_month = parse_year_month(month)
+        return month
+
+class TaskStatus(db.Model):
+    """One checkbox of a client's month, mirroring an entry of MonthlyTask.tasks."""
+    __tablename__ = 'task_statuses'
+    __table_args__ = (
+        db.Index('ix_task_statuses_year_month_task_name_done', 'year_month', 'task_name', 'done'),
+    )
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id', ondelete='CASCADE'), primary_key=True)
+    year_month = db.Column(db.Integer, primary_key=True)
+    task_name = db.Column(db.String(255), primary_key=True)
+    done = db.Column(db.Boolean, nullable=False, default=False)
+    note = db.Column(db.Text, nullable=False, default='')
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+
 class DefaultTask(db.Model):
     __tablename__ = 'default_tasks'
     id = db.Column(db.Integer, primary_key=True)
@@ -118,8 +213,26 @@ class Setting(db.Model):
             'value': self.value
         }
 
+class CacheVersion(db.Model):
+    """Shared invalidation counter for the in-process reference data cache."""
+    __tablename__ = 'cache_versions'
+    name = db.Column(db.String(255), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class DeletedClient(db.Model):
+    """Tombstone recorded by delete_client so delta sync can report removals."""
+    __tablename__ = 'deleted_clients'
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False, index=True)
+
 class EditingSession(db.Model):
     __tablename__ = 'editing_sessions'
+    __table_args__ = (
+        # One editor per client; claims upsert on it and the reaper range-deletes on last_activity
+        db.Index('uq_editing_sessions_client_id', 'client_id', unique=True),
+        db.Index('ix_editing_sessions_last_activity', 'last_activity'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
     user_id = db.Column(db.String(255), nullable=False)  # For now, use IP address or session ID
@@ -137,60 +250,893 @@ class EditingSession(db.Model):
             'last_activity': self.last_activity.isoformat() if self.last_activity else None
         }
 
+# --- Monthly Progress Helpers ---
+
+def parse_year_month(label):
+    """Convert a 'YYYY年M月' label (month may be zero-padded) into an integer YYYYMM key."""
+    parsed = datetime.strptime(label.strip(), '%Y年%m月')
+    return parsed.year * 100 + parsed.month
+
+def format_year_month(year_month):
+    """Convert an integer YYYYMM key back into the label used by the frontend."""
+    return f"{year_month // 100}年{year_month % 100}月"
+
+def shift_year_month(year_month, months):
+    """Move a YYYYMM key by the given number of months (negative goes back)."""
+    index = (year_month // 100) * 12 + (year_month % 100 - 1) + months
+    return (index // 12) * 100 + index % 12 + 1
+
+def unattended_months_label(month_key, today=None):
+    """Format the months elapsed since a YYYYMM key the way the dashboard expects."""
+    if month_key is None:
+        return "-"
+    today = today or datetime.now()
+    month_diff = (today.year * 12 + today.month) - ((month_key // 100) * 12 + month_key % 100)
+    return f"{max(month_diff, 0)}ヶ月"
+
+def refresh_progress_summary(client_ids=None):
+    """Recompute the persisted latest '月次完了' month for the given clients (all if None).
+
+    `client_ids` may be a list of ids or a SELECT returning them. Runs as a single UPDATE with correlated subqueries inside the caller's
+    transaction; updated_at is left untouched since this is derived data.
+    """
+    db.session.flush()
+    completed = db.and_(MonthlyTask.client_id == Client.id, MonthlyTask.status == '月次完了')
+    latest_month = db.select(MonthlyTask.month).where(completed) \
+        .order_by(MonthlyTask.year_month.desc()).limit(1).scalar_subquery()
+    latest_key = db.select(db.func.max(MonthlyTask.year_month)).where(completed).scalar_subquery()
+
+    stmt = db.update(Client).values(
+        latest_completed_month=latest_month,
+        latest_completed_month_key=latest_key,
+        updated_at=Client.updated_at
+    )
+    if client_ids is not None:
+        if not isinstance(client_ids, db.Select):
+            client_ids = list(client_ids)
+        stmt = stmt.where(Client.id.in_(client_ids))
+    result = db.session.execute(stmt, execution_options={'synchronize_session': False})
+    return result.rowcount
+
+# --- Conditional GET Helpers ---
+
+def compute_etag(*parts):
+    """Build a strong ETag from cheap validators (row counts, max updated_at, ...)."""
+    return hashlib.sha1(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+
+def table_fingerprint(model, *criteria):
+    """Row count and newest updated_at of a table, in one aggregate query."""
+    query = db.session.query(db.func.count(), db.func.max(model.updated_at))
+    if criteria:
+        query = query.filter(*criteria)
+    return tuple(query.one())
+
+def not_modified_response(etag):
+    """Return a 304 response when the request already holds `etag`, otherwise None."""
+    from flask import request, make_response
+    if request.method not in ('GET', 'HEAD') or not request.if_none_match.contains(etag):
+        return None
+    response = make_response('', 304)
+    return with_etag(response, etag)
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate on every navigation
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# --- Database Helpers ---
+
+def dialect_insert(model):
+    """INSERT construct supporting ON CONFLICT for the active database (PostgreSQL or SQLite)."""
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+# --- JSON Task Map SQL ---
+# Expressions that read or edit the JSON columns (e.g. MonthlyTask.tasks,
+# {name: {"checked", "note"}}) inside the database, so bulk operations never
+# load rows into the app. They are JSONB on PostgreSQL, where the GIN indexes
+# serve the containment and key-existence conditions, and JSON1 on SQLite.
+
+def json_key_path(name):
+    """SQLite JSON path for a top-level key."""
+    if '"' in name:
+        raise ValueError(f'Task names cannot contain double quotes: {name}')
+    return f'$."{name}"'
+
+def pg_jsonb(column, default=None):
+    """`column` with JSONB operators, NULL replaced by `default` if given."""
+    if default is not None:
+        column = db.func.coalesce(column, db.literal(default, postgresql.JSONB))
+    return db.type_coerce(column, postgresql.JSONB)
+
+def json_tasks_checked(column, names):
+    """Expression for `column` with each task in `names` checked, keeping its note."""
+    if db.engine.dialect.name == 'postgresql':
+        doc = pg_jsonb(column, {})
+        changes = []
+        for name in names:
+            note = db.func.coalesce(doc[(name, 'note')].astext, '')
+            changes += [db.cast(name, db.Text), db.func.jsonb_build_object('checked', True, 'note', note)]
+        return doc.op('||')(db.func.jsonb_build_object(*changes))
+
+    changes = []
+    for name in names:
+        path = json_key_path(name)
+        note = db.func.coalesce(db.func.json_extract(column, path + '.note'), '')
+        changes += [path, db.func.json_object('checked', db.func.json('true'), 'note', note)]
+    return db.func.json_set(db.func.coalesce(column, '{}'), *changes)
+
+def json_task_done(column, name):
+    """Condition: task `name` is checked in the tasks map `column` (object or legacy bare true)."""
+    if db.engine.dialect.name == 'postgresql':
+        doc = pg_jsonb(column)
+        return db.or_(doc.contains({name: {'checked': True}}), doc.contains({name: True}))
+    path = json_key_path(name)
+    return db.or_(db.func.json_extract(column, path + '.checked') == 1, db.func.json_extract(column, path) == 1)
+
+def json_tasks_without(column, names):
+    """(expression for `column` minus the keys in `names`, condition: any of them present)."""
+    if db.engine.dialect.name == 'postgresql':
+        doc = pg_jsonb(column)
+        keys = db.literal(list(names), postgresql.ARRAY(db.Text))
+        return doc.op('-')(keys), doc.has_any(keys)
+    paths = [json_key_path(name) for name in names]
+    present = db.or_(*(db.func.json_type(column, path).is_not(None) for path in paths))
+    return db.func.json_remove(column, *paths), present
+
+def json_object_set(column, key, value):
+    """Expression for the JSON object `column` with top-level `key` replaced by `value`."""
+    if db.engine.dialect.name == 'postgresql':
+        change = db.func.jsonb_build_object(db.cast(key, db.Text), db.literal(value, postgresql.JSONB))
+        return pg_jsonb(column, {}).op('||')(change)
+    encoded = json.dumps(value, ensure_ascii=False)
+    return db.func.json_set(db.func.coalesce(column, '{}'), json_key_path(key), db.func.json(encoded))
+
+def json_object_value_differs(column, key, value):
+    """Condition: top-level `key` of the JSON object `column` is not `value`."""
+    if db.engine.dialect.name == 'postgresql':
+        return pg_jsonb(column)[key].is_distinct_from(db.literal(value, postgresql.JSONB))
+    encoded = json.dumps(value, ensure_ascii=False)
+    return db.func.json_extract(column, json_key_path(key)).is_distinct_from(db.func.json(encoded))
+
+def json_array_contains(column, value):
+    """Condition: the JSON array `column` has the string `value` as an element."""
+    if db.engine.dialect.name == 'postgresql':
+        return pg_jsonb(column, []).has_key(value)
+    elements = db.func.json_each(column).table_valued('value')
+    return db.exists(db.select(1).select_from(elements).where(elements.c.value == value))
+
+# --- Normalized Task Statuses ---
+# With TASK_STATUS_STORAGE = 'dual' or 'table', checkbox state is also kept as
+# one task_statuses row per (client, month, task). In 'table' mode the rows are
+# the source of truth: responses are rebuilt from them and ticking a box is a
+# single-row upsert instead of rewriting the month's JSON document.
+
+def task_status_table_enabled():
+    return TASK_STATUS_STORAGE in ('dual', 'table')
+
+def json_task_entries(column):
+    """(table-valued entries of the tasks map `column`, done expression, note expression)."""
+    if db.engine.dialect.name == 'postgresql':
+        entries = db.func.jsonb_each(pg_jsonb(column)).table_valued('key', 'value').lateral()
+        value = db.type_coerce(entries.c.value, postgresql.JSONB)
+        done = db.case(
+            (db.func.jsonb_typeof(value) == 'object', db.func.coalesce(value['checked'].astext.cast(db.Boolean), False)),
+            else_=value == db.literal(True, postgresql.JSONB)
+        )
+        return entries, done, db.func.coalesce(value['note'].astext, '')
+    entries = db.func.json_each(column).table_valued('key', 'value', 'type')
+    done = db.case(
+        (entries.c.type == 'object', db.func.coalesce(db.func.json_extract(entries.c.value, '$.checked'), 0) == 1),
+        else_=entries.c.type == 'true'
+    )
+    note = db.case((entries.c.type == 'object', db.func.coalesce(db.func.json_extract(entries.c.value, '$.note'), '')),
+                   else_='')
+    return entries, done, note
+
+def sync_task_statuses(*criteria):
+    """Rebuild task_statuses from monthly_tasks.tasks for the month rows matching `criteria`.
+
+    Two set-based statements (DELETE, then INSERT ... SELECT over the JSON
+    entries); used for the backfill and for dual writes. Returns rows written.
+    """
+    months = db.select(MonthlyTask.client_id, MonthlyTask.year_month).where(*criteria)
+    db.session.execute(
+        db.delete(TaskStatus).where(db.tuple_(TaskStatus.client_id, TaskStatus.year_month).in_(months)),
+        execution_options={'synchronize_session': False}
+    )
+    entries, done, note = json_task_entries(MonthlyTask.tasks)
+    rows = db.select(
+        MonthlyTask.client_id, MonthlyTask.year_month, entries.c.key, done, note,
+        db.literal(datetime.now(timezone.utc), db.DateTime)
+    ).select_from(MonthlyTask).join(entries, db.true()).where(*criteria)
+    return db.session.execute(
+        db.insert(TaskStatus).from_select(
+            ['client_id', 'year_month', 'task_name', 'done', 'note', 'updated_at'], rows)
+    ).rowcount
+
+def mirror_task_statuses(*criteria):
+    """In 'dual' mode, copy the JSON just written for `criteria` into task_statuses."""
+    if TASK_STATUS_STORAGE == 'dual':
+        sync_task_statuses(*criteria)
+
+def load_task_states(client_id, year_months):
+    """{year_month: tasks map} for one client, rebuilt from task_statuses."""
+    states = {year_month: {} for year_month in year_months}
+    rows = db.session.query(TaskStatus.year_month, TaskStatus.task_name, TaskStatus.done, TaskStatus.note) \
+        .filter(TaskStatus.client_id == client_id, TaskStatus.year_month.in_(list(year_months)))
+    for year_month, name, done, note in rows:
+        states[year_month][name] = {'checked': done, 'note': note}
+    return states
+
+def replace_task_states(client_id, states, now):
+    """Replace the task_statuses rows of the months in `states` ({year_month: tasks map})."""
+    db.session.execute(
+        db.delete(TaskStatus).where(TaskStatus.client_id == client_id, TaskStatus.year_month.in_(list(states))),
+        execution_options={'synchronize_session': False}
+    )
+    rows = [
+        {'client_id': client_id, 'year_month': year_month, 'task_name': name,
+         'done': bool(state.get('checked')) if isinstance(state, dict) else bool(state),
+         'note': (state.get('note') or '') if isinstance(state, dict) else '',
+         'updated_at': now}
+        for year_month, tasks in states.items() for name, state in (tasks or {}).items()
+    ]
+    if rows:
+        db.session.execute(db.insert(TaskStatus), rows)
+
+def upsert_task_states(client_id, year_month, changes, now):
+    """Apply a {task name: checked | {checked, note}} delta: one upsert per changed task."""
+    for name, change in changes.items():
+        if isinstance(change, dict):
+            values = {'done': bool(change['checked'])} if 'checked' in change else {}
+            if 'note' in change:
+                values['note'] = change['note'] or ''
+        else:
+            values = {'done': bool(change)}
+        stmt = dialect_insert(TaskStatus).values(
+            client_id=client_id, year_month=year_month, task_name=name,
+            done=values.get('done', False), note=values.get('note', ''), updated_at=now
+        )
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['client_id', 'year_month', 'task_name'],
+            set_={field: stmt.excluded[field] for field in [*values, 'updated_at']}
+        ))
+
+def monthly_task_dicts(tasks):
+    """to_dict() of a client's MonthlyTask rows, with tasks from task_statuses in 'table' mode."""
+    rows = [task.to_dict() for task in tasks]
+    if TASK_STATUS_STORAGE == 'table' and tasks:
+        states = load_task_states(tasks[0].client_id, [task.year_month for task in tasks])
+        for row, task in zip(rows, tasks):
+            row['tasks'] = states[task.year_month]
+    return rows
+
+# --- Optimistic Concurrency ---
+# Client and MonthlyTask carry a version counter (SQLAlchemy version_id_col), so
+# every ORM UPDATE/DELETE is issued as "... WHERE id = ? AND version = ?" and
+# raises StaleDataError if another request got there first. Callers may also
+# send the version they read; a mismatch is rejected before anything is written.
+
+class VersionConflict(Exception):
+    """The caller's copy of a row is older than the stored one."""
+
+class LockUnavailable(Exception):
+    """Another transaction holds a lock this write needs (NOWAIT refused or lock_timeout hit)."""
+
+class InvalidVersion(Exception):
+    """The caller sent a version that is not a whole number."""
+
+# Errors from the version and lock checks; conflict_response maps each to its status
+CONFLICT_ERRORS = (VersionConflict, StaleDataError, LockUnavailable, InvalidVersion)
+
+def check_version(obj, data):
+    """Raise VersionConflict if data['version'] is given and is not obj's current version.
+
+    A version that is not an integer (or a string of digits) raises InvalidVersion.
+    """
+    expected = (data or {}).get('version')
+    if expected is None:
+        return
+    if isinstance(expected, str) and expected.strip().isdigit():
+        expected = int(expected)
+    if not isinstance(expected, int) or isinstance(expected, bool):
+        raise InvalidVersion(f"version must be an integer, got {expected!r}")
+    if expected != obj.version:
+        raise VersionConflict(f"{type(obj).__name__} {obj.id}: expected version {expected}, found {obj.version}")
+
+def conflict_response(error):
+    if isinstance(error, InvalidVersion):
+        return jsonify({"error": str(error)}), 400
+    if isinstance(error, LockUnavailable):
+        print(f"Lock unavailable: {error}")
+        response = jsonify({"error": "This data is being saved by another request. Please try again."})
+        response.headers['Retry-After'] = '1'
+        return response, 423
+    print(f"Version conflict: {error}")
+    return jsonify({"error": "This data was updated by another user. Please reload."}), 409
+
+# --- Write Locks ---
+# WRITE_LOCK_MODE decides what lock_client() takes before a per-client write:
+#   'none'     - nothing; the version checks above catch lost updates (default)
+#   'wait'     - SELECT ... FOR UPDATE on the client row
+#   'nowait'   - SELECT ... FOR UPDATE NOWAIT; a held row fails at once
+#   'advisory' - a transaction-scoped PostgreSQL advisory lock keyed by client id,
+#                so the row itself stays free for readers and bulk statements
+# WRITE_LOCK_TIMEOUT_MS sets PostgreSQL's lock_timeout for the client data writes
+# decorated with @bounded_lock_wait, which also bounds the row locks UPDATEs wait for. Refused or timed-out locks raise
+# LockUnavailable and are answered with 423. Wait times are kept per process for
+# /api/metrics and reported on the response in a Server-Timing header.
+
+CLIENT_ADVISORY_LOCK_SPACE = 4201  # First key of the two-key advisory lock; the client id is the second
+
+lock_wait_stats = {'acquired': 0, 'unavailable': 0, 'wait_ms_total': 0.0, 'wait_ms_max': 0.0}
+_lock_wait_stats_lock = threading.Lock()
+
+def record_lock_wait(wait_ms=None):
+    """Count a lock taken after wait_ms, or a refused lock when wait_ms is None."""
+    from flask import g, has_request_context
+    with _lock_wait_stats_lock:
+        if wait_ms is None:
+            lock_wait_stats['unavailable'] += 1
+        else:
+            lock_wait_stats['acquired'] += 1
+            lock_wait_stats['wait_ms_total'] += wait_ms
+            lock_wait_stats['wait_ms_max'] = max(lock_wait_stats['wait_ms_max'], wait_ms)
+    if wait_ms is not None and has_request_context():
+        g.lock_wait_ms = g.get('lock_wait_ms', 0.0) + wait_ms
+
+def lock_client(client_id):
+    """Load a client for a write under WRITE_LOCK_MODE; None if it does not exist."""
+    if WRITE_LOCK_MODE == 'none':
+        return db.session.get(Client, client_id)
+
+    started = time.perf_counter()
+    if WRITE_LOCK_MODE == 'advisory':
+        if db.engine.dialect.name == 'postgresql':
+            key = (CLIENT_ADVISORY_LOCK_SPACE, client_id)
+            if WRITE_LOCK_TIMEOUT_MS:
+                # Waits, but no longer than lock_timeout
+                db.session.execute(db.select(db.func.pg_advisory_xact_lock(*key)))
+            elif not db.session.scalar(db.select(db.func.pg_try_advisory_xact_lock(*key))):
+                record_lock_wait(None)
+                raise LockUnavailable(f"client {client_id} is locked by another request")
+        client = db.session.get(Client, client_id)
+    else:
+        client = db.session.get(Client, client_id, with_for_update={'nowait': WRITE_LOCK_MODE == 'nowait'})
+    record_lock_wait((time.perf_counter() - started) * 1000)
+    return client
+
+def set_lock_timeout():
+    """Bound every lock wait of the current transaction by WRITE_LOCK_TIMEOUT_MS (PostgreSQL only)."""
+    if WRITE_LOCK_TIMEOUT_MS and db.engine.dialect.name == 'postgresql':
+        # is_local=true scopes it to the request's transaction, like SET LOCAL
+        db.session.execute(db.select(db.func.set_config('lock_timeout', f'{WRITE_LOCK_TIMEOUT_MS}ms', True)))
+
+def bounded_lock_wait(view):
+    """Decorate a client data write so its lock waits are bounded by WRITE_LOCK_TIMEOUT_MS."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        set_lock_timeout()
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.after_request
+def add_lock_wait_timing(response):
+    from flask import g
+    if 'lock_wait_ms' in g:
+        response.headers.add('Server-Timing', f'lock;dur={g.lock_wait_ms:.1f}')
+    return response
+
+@db.event.listens_for(Engine, 'handle_error')
+def translate_lock_errors(context):
+    # SQLSTATE 55P03 lock_not_available: NOWAIT refused or lock_timeout expired
+    if getattr(context.original_exception, 'pgcode', None) == '55P03':
+        record_lock_wait(None)
+        raise LockUnavailable(str(context.original_exception).strip()) from context.original_exception
+
+# --- Change Events ---
+# Editing presence and client changes pushed to /api/events. Write paths call
+# publish_event(); events ride on the current transaction and reach subscribers
+# only if it commits. With the 'postgres' broker they are sent with NOTIFY in
+# that transaction and every worker's LISTEN thread fans them out to its own
+# streams; the 'memory' broker delivers after commit within this process.
+
+EVENT_QUEUE_SIZE = 100
+EVENT_KEEPALIVE_SECONDS = 15
+EVENT_RETRY_MS = 5000
+
+_event_stream_slots = threading.BoundedSemaphore(EVENT_STREAM_LIMIT)
+
+class EventSubscription:
+    """One /api/events stream; client_ids limits it to those clients plus bulk changes."""
+
+    def __init__(self, client_ids=None):
+        self.client_ids = set(client_ids or ())
+        self.queue = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+
+    def wants(self, message):
+        return not self.client_ids or message.get('client_id') is None or message['client_id'] in self.client_ids
+
+class InProcessEventBroker:
+    """Fans events out to the streams of this process only (single worker, tests)."""
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, client_ids=None):
+        subscription = EventSubscription(client_ids)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def dispatch(self, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.wants(message):
+                try:
+                    subscription.queue.put_nowait(message)
+                except queue.Full:
+                    pass  # A stalled stream misses events rather than holding memory
+
+    def send(self, session, messages):
+        """Called inside the committing transaction."""
+
+    def deliver(self, messages):
+        """Called once the transaction has committed."""
+        for message in messages:
+            self.dispatch(message)
+
+class PostgresEventBroker(InProcessEventBroker):
+    """NOTIFY in the committing transaction; a LISTEN thread per worker dispatches to its streams."""
+
+    channel = 'client_events'
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, client_ids=None):
+        # The listener holds a connection of its own, so only workers serving streams start one
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='client-event-listener', daemon=True)
+                self._listener.start()
+        return super().subscribe(client_ids)
+
+    def send(self, session, messages):
+        payloads = [json.dumps(message, ensure_ascii=False) for message in messages]
+        session.execute(db.select(db.func.pg_notify(self.channel, db.func.unnest(postgresql.array(payloads)))))
+
+    def deliver(self, messages):
+        pass  # Our own NOTIFY comes back through the listener like any other worker's
+
+    def _listen(self):
+        while True:
+            connection = None
+            try:
+                with app.app_context():
+                    connection = db.engine.raw_connection()
+                connection.detach()  # LISTEN state must not go back to the pool
+                listener = connection.driver_connection
+                listener.autocommit = True
+                listener.cursor().execute(f"LISTEN {self.channel}")
+                while True:
+                    if select.select([listener], [], [], EVENT_KEEPALIVE_SECONDS) == ([], [], []):
+                        continue
+                    listener.poll()
+                    while listener.notifies:
+                        self.dispatch(json.loads(listener.notifies.pop(0).payload))
+            except Exception as e:
+                print(f"Error listening for client events: {e}")
+                time.sleep(1)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+def create_event_broker(kind):
+    if kind == 'postgres':
+        return PostgresEventBroker()
+    if kind == 'memory':
+        return InProcessEventBroker()
+    raise ValueError(f"Unknown event broker: {kind}")
+
+event_broker = create_event_broker(EVENT_BROKER)
+
+def publish_event(event_type, client_id=None, **data):
+    """Queue an event on the current transaction; client_id=None means several clients changed."""
+    db.session.info.setdefault('pending_events', []).append({'type': event_type, 'client_id': client_id, **data})
+
+@db.event.listens_for(db.session, 'before_commit')
+def send_pending_events(session):
+    messages = session.info.get('pending_events')
+    if messages:
+        event_broker.send(session, messages)
+
+@db.event.listens_for(db.session, 'after_commit')
+def deliver_pending_events(session):
+    messages = session.info.pop('pending_events', None)
+    if messages:
+        event_broker.deliver(messages)
+
+@db.event.listens_for(db.session, 'after_rollback')
+def drop_pending_events(session):
+    session.info.pop('pending_events', None)
+
+# --- Reference Data Cache ---
+# Staffs, settings and default tasks change a few times a month, so each worker
+# keeps them in memory. Writers bump a counter in cache_versions inside their
+# transaction; every request reads the counters once and drops stale entries.
+
+REFERENCE_CACHE_TTL = int(os.environ.get('REFERENCE_CACHE_TTL', 300))
+REFERENCE_CACHE_NAMES = ('staffs', 'settings', 'default_tasks')
+
+_reference_cache = {}  # name -> (version, expires_at, value, etag)
+
+def reference_cache_versions():
+    """Current invalidation counters, read at most once per request."""
+    from flask import g, has_request_context
+    if has_request_context() and 'reference_cache_versions' in g:
+        return g.reference_cache_versions
+    versions = dict(db.session.query(CacheVersion.name, CacheVersion.version).all())
+    if has_request_context():
+        g.reference_cache_versions = versions
+    return versions
+
+def cached_reference_data(name, loader):
+    """Return (value, etag) for `name`, calling `loader` on a miss, expiry or version bump.
+
+    Cached values are shared between requests and must not be mutated by callers.
+    """
+    version = reference_cache_versions().get(name, 0)
+    entry = _reference_cache.get(name)
+    now = time.monotonic()
+    if entry and entry[0] == version and entry[1] > now:
+        return entry[2], entry[3]
+
+    value = loader()
+    etag = compute_etag(name, value)
+    _reference_cache[name] = (version, now + REFERENCE_CACHE_TTL, value, etag)
+    return value, etag
+
+def invalidate_reference_cache(*names):
+    """Bump the shared counters so every worker reloads `names`; commits with the caller's transaction."""
+    from flask import g, has_request_context
+    for name in names:
+        stmt = dialect_insert(CacheVersion).values(name=name, version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CacheVersion.name],
+            set_={'version': CacheVersion.version + 1}
+        )
+        db.session.execute(stmt)
+        _reference_cache.pop(name, None)
+    if has_request_context():
+        g.pop('reference_cache_versions', None)
+
+def load_staffs():
+    return [staff_to_dict(s) for s in Staff.query.order_by(Staff.id).all()]
+
+def load_settings():
+    return {s.key: s.value for s in Setting.query.all()}
+
+def load_default_tasks():
+    return {d.accounting_method: d.tasks for d in DefaultTask.query.all()}
+
+def initial_custom_tasks_for(accounting_method):
+    """custom_tasks_by_year for a new client, seeded from the cached default tasks."""
+    default_tasks, _ = cached_reference_data('default_tasks', load_default_tasks)
+    tasks = default_tasks.get(accounting_method)
+    if not tasks:
+        return {}
+    return {str(datetime.now().year): list(tasks)}
+
+# --- Client List Filtering ---
+
+CLIENT_LIST_MAX_LIMIT = 500
+CLIENT_LIST_CHUNK_SIZE = 500
+
+def client_sort_columns():
+    """Sortable dashboard columns; each expression is non-null so it can be used in a keyset cursor."""
+    progress_key = db.func.coalesce(Client.latest_completed_month_key, 0)
+    return {
+        'id': Client.id,
+        'name': Client.name,
+        'fiscal_month': Client.fiscal_month,
+        'staff_name': Staff.name,
+        'accounting_method': db.func.coalesce(Client.accounting_method, ''),
+        'status': db.func.coalesce(Client.status, ''),
+        'monthly_progress': progress_key,
+        'unattended_months': 0 - progress_key,
+    }
+
+def parse_int_param(params, name, minimum=None, maximum=None):
+    value = params.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ValueError(f"{name} must be between {minimum} and {maximum}")
+    return value
+
+def parse_bool_param(params, name):
+    value = params.get(name)
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ('1', 'true', 'yes'):
+        return True
+    if str(value).lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"{name} must be true or false")
+
+CLIENT_FILTER_KEYS = ('staff_id', 'staff_name', 'fiscal_month', 'accounting_method',
+                      'status', 'is_inactive', 'min_unattended_months')
+
+def apply_client_filters(query, params, strict=False):
+    """Narrow a Client query by the dashboard filters.
+
+    `params` may be request.args or a plain dict. Raises ValueError for invalid
+    values, and with strict=True (used by writers) also for unknown keys.
+    """
+    if strict:
+        unknown = set(params) - set(CLIENT_FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unsupported filter keys: {', '.join(sorted(unknown))}")
+    staff_id = parse_int_param(params, 'staff_id')
+    if staff_id is not None:
+        query = query.filter(Client.staff_id == staff_id)
+    if params.get('staff_name'):
+        query = query.filter(Client.staff_id.in_(db.select(Staff.id).where(Staff.name == params['staff_name'])))
+
+    fiscal_month = parse_int_param(params, 'fiscal_month', 1, 12)
+    if fiscal_month is not None:
+        query = query.filter(Client.fiscal_month == fiscal_month)
+
+    if params.get('accounting_method'):
+        query = query.filter(Client.accounting_method == params['accounting_method'])
+    if params.get('status'):
+        query = query.filter(Client.status == params['status'])
+
+    is_inactive = parse_bool_param(params, 'is_inactive')
+    if is_inactive is not None:
+        query = query.filter(Client.is_inactive == is_inactive)
+
+    min_unattended = parse_int_param(params, 'min_unattended_months', 0)
+    if min_unattended is not None:
+        today = datetime.now()
+        cutoff = shift_year_month(today.year * 100 + today.month, -min_unattended)
+        query = query.filter(Client.latest_completed_month_key <= cutoff)
+
+    return query
+
+def stream_json_array(query, serialize, chunk_size=CLIENT_LIST_CHUNK_SIZE):
+    """Stream a query's rows as a JSON array, fetching and encoding one chunk at a time.
+
+    The first chunk is fetched before the response starts so database errors
+    still surface as a normal error response rather than a truncated body.
+    """
+    from flask import Response, stream_with_context
+    rows = iter(query.yield_per(chunk_size))
+    first_chunk = list(islice(rows, chunk_size))
+
+    def generate():
+        chunk = first_chunk
+        separator = '['
+        while chunk:
+            yield separator + ','.join(app.json.dumps(serialize(row)) for row in chunk)
+            separator = ','
+            chunk = list(islice(rows, chunk_size))
+        yield '[]' if separator == '[' else ']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def encode_cursor(sort_value, client_id):
+    raw = json.dumps([sort_value, client_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        sort_value, client_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return sort_value, int(client_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
 # --- API Endpoints ---
 
 @app.route('/api/clients', methods=['GET'])
 def get_clients():
+    """List clients.
+
+    Optional filters: staff_id, staff_name, fiscal_month, accounting_method, status,
+    is_inactive, min_unattended_months. Optional ordering: sort, order=asc|desc.
+    Without `limit` the full (filtered) list is returned as a JSON array; with
+    `limit` the response is {"clients": [...], "next_cursor": ...} and `cursor`
+    continues from the previous page.
+    """
+    from flask import request
     try:
-        clients = Client.query.join(Staff).order_by(Client.id).all()
-        client_list = []
-        for client in clients:
-            client_dict = client.to_dict()
-            
-            # Calculate latest completed month
-            completed_tasks = [task for task in client.monthly_tasks if task.status == '月次完了']
-            latest_completed_month = "未完了"
-            if completed_tasks:
-                latest_task = max(completed_tasks, key=lambda task: datetime.strptime(task.month, '%Y年%m月'))
-                latest_completed_month = latest_task.month
-            
-            client_dict['monthlyProgress'] = latest_completed_month
-            
-            # Calculate unattended months
-            unattended_months_str = "-"
-            if latest_completed_month != "未完了":
-                try:
-                    completed_date = datetime.strptime(latest_completed_month, '%Y年%m月')
-                    current_date = datetime.now()
-                    month_diff = (current_date.year - completed_date.year) * 12 + (current_date.month - completed_date.month)
-                    if month_diff > 0:
-                        unattended_months_str = f"{month_diff}ヶ月"
-                    else:
-                        unattended_months_str = "0ヶ月"
-                except ValueError:
-                    unattended_months_str = "エラー"
-            
-            client_dict['unattendedMonths'] = unattended_months_str
-
-            client_list.append(client_dict)
+        sort_columns = client_sort_columns()
+        sort_key = request.args.get('sort', 'id')
+        if sort_key not in sort_columns:
+            return jsonify({"error": f"Invalid sort key. Must be one of: {', '.join(sort_columns)}"}), 400
+        descending = request.args.get('order', 'asc').lower() == 'desc'
+        sort_column = sort_columns[sort_key]
+
+        # unattendedMonths depends on the current month and the progress summary
+        # is refreshed without touching updated_at, so both feed the validator.
+        # Every client write bumps version, so sum(version) changes even when a
+        # write's updated_at is older than the newest one (transaction-start stamps).
+        today = datetime.now()
+        client_stats = db.session.query(
+            db.func.count(), db.func.sum(Client.version), db.func.max(Client.updated_at),
+            db.func.sum(db.func.coalesce(Client.latest_completed_month_key, 0))
+        ).one()
+        etag = compute_etag('clients', request.query_string.decode('utf-8'),
+                            today.year * 100 + today.month,
+                            tuple(client_stats), table_fingerprint(Staff))
+        cached = not_modified_response(etag)
+        if cached:
+            return cached
+
+        # Read before the list so /api/clients/changes?since=<token> cannot miss a write
+        changes_token = db.session.query(db.func.now()).scalar()
+        query = apply_client_filters(Client.query.join(Client.staff), request.args) \
+            .options(contains_eager(Client.staff))
+
+        limit = parse_int_param(request.args, 'limit', 1, CLIENT_LIST_MAX_LIMIT)
+        cursor = request.args.get('cursor')
+        if cursor:
+            if limit is None:
+                return jsonify({"error": "cursor requires limit"}), 400
+            sort_value, last_id = decode_cursor(cursor)
+            if descending:
+                query = query.filter(db.or_(sort_column < sort_value,
+                                            db.and_(sort_column == sort_value, Client.id < last_id)))
+            else:
+                query = query.filter(db.or_(sort_column > sort_value,
+                                            db.and_(sort_column == sort_value, Client.id > last_id)))
 
-        return jsonify(client_list)
+        if descending:
+            query = query.order_by(sort_column.desc(), Client.id.desc())
+        else:
+            query = query.order_by(sort_column.asc(), Client.id.asc())
+
+        if limit is None:
+            response = with_etag(stream_json_array(query, Client.to_dict), etag)
+            response.headers['X-Changes-Token'] = changes_token.isoformat()
+            return response
+
+        # Fetch the sort value alongside each row so the next cursor needs no recomputation
+        rows = query.add_columns(sort_column).limit(limit + 1).all()
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last_client, last_sort_value = page[-1]
+            next_cursor = encode_cursor(last_sort_value, last_client.id)
+        return with_etag(jsonify({
+            "clients": [client.to_dict() for client, _ in page],
+            "next_cursor": next_cursor
+        }), etag)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error fetching clients: {e}")
         return jsonify({"error": "Could not fetch clients"}), 500
 
 
 
+# Writes stamp updated_at when their transaction starts (PostgreSQL now()), so a
+# row can become visible slightly after its timestamp. Re-scan a short window
+# before the token; clients must treat the changes feed as idempotent.
+CHANGES_TOKEN_OVERLAP = timedelta(seconds=5)
+# Deletion tombstones are pruned after this long (see prune_deleted_clients), so an
+# older `since` token can no longer see every removal and must resync from scratch.
+DELETED_CLIENT_RETENTION = timedelta(days=int(os.environ.get('DELETED_CLIENT_RETENTION_DAYS', '30')))
+
+def prune_deleted_clients():
+    """Delete tombstones older than DELETED_CLIENT_RETENTION; returns how many were removed."""
+    cutoff = db.session.query(db.func.now()).scalar() - DELETED_CLIENT_RETENTION
+    return DeletedClient.query.filter(DeletedClient.deleted_at < cutoff).delete(synchronize_session=False)
+
+@app.route('/api/clients/changes', methods=['GET'])
+def get_client_changes():
+    """Return clients changed (and ids deleted) since `since`, plus the token for the next call.
+
+    Without `since` every client is returned, which is how a dashboard starts syncing.
+    A `since` older than DELETED_CLIENT_RETENTION gets 410 with {"resync": true}: its
+    tombstones may be gone, so the caller must reload the full list.
+    """
+    from flask import request
+    try:
+        token = db.session.query(db.func.now()).scalar()
+
+        since = None
+        if request.args.get('since'):
+            try:
+                since = datetime.fromisoformat(request.args['since']) - CHANGES_TOKEN_OVERLAP
+                expired = since < token - DELETED_CLIENT_RETENTION
+            except (ValueError, TypeError):
+                return jsonify({"error": "Invalid since token"}), 400
+            if expired:
+                return jsonify({"error": "since token is too old; reload all clients", "resync": True}), 410
+
+        query = Client.query.join(Client.staff).options(contains_eager(Client.staff))
+        deleted_ids = []
+        if since is not None:
+            changed_tasks = db.select(MonthlyTask.client_id).where(MonthlyTask.updated_at >= since)
+            query = query.filter(db.or_(Client.updated_at >= since, Client.id.in_(changed_tasks)))
+            deleted_ids = [
+                client_id for (client_id,) in
+                db.session.query(DeletedClient.client_id).distinct()
+                .filter(DeletedClient.deleted_at >= since)
+                .filter(~DeletedClient.client_id.in_(db.select(Client.id)))
+                .order_by(DeletedClient.client_id)
+            ]
+
+        return jsonify({
+            "clients": [client.to_dict() for client in query.order_by(Client.id)],
+            "deleted": deleted_ids,
+            "token": token.isoformat()
+        })
+    except Exception as e:
+        print(f"Error fetching client changes: {e}")
+        return jsonify({"error": "Could not fetch client changes"}), 500
+
+VALID_ACCOUNTING_METHODS = ['記帳代行', '自計']  # Adjust as needed
+VALID_CLIENT_STATUSES = ['未着手', '依頼中', 'チェック待ち', '作業中', '完了']
+
+def upsert_clients(rows, update_fields=()):
+    """Write client rows with one batched INSERT ... ON CONFLICT and return the written clients.
+
+    Rows colliding with an existing client are skipped, or, when update_fields
+    is given, have those fields overwritten with a version bump. Freshly
+    inserted clients come back at version 1; updated ones at a higher version.
+    """
+    if not rows:
+        return []
+    stmt = dialect_insert(Client)
+    if update_fields:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Client.id],
+            set_={
+                **{field: stmt.excluded[field] for field in update_fields},
+                'version': Client.version + 1,
+                'updated_at': db.func.now(),
+            }
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing()
+    rows = [{'custom_tasks_by_year': {}, 'finalized_years': [], 'version': 1, **row} for row in rows]
+    return db.session.scalars(
+        stmt.returning(Client), rows, execution_options={'populate_existing': True}
+    ).all()
+
 @app.route('/api/clients', methods=['POST'])
 def create_client():
+    """Create a client with a single upsert.
+
+    An optional Idempotency-Key header makes retries safe: repeating a request
+    whose client was already created with the same key returns that client
+    (200) instead of a conflict.
+    """
     from flask import request
     try:
         data = request.get_json()
         if not data:
             return jsonify({"error": "Invalid data"}), 400
 
-        print(f"DEBUG: Received data for create_client: {data}")
-
         required_fields = ['id', 'name', 'fiscal_month', 'staff_id', 'accounting_method']
         missing_fields = [field for field in required_fields if field not in data]
         if missing_fields:
@@ -206,96 +1152,297 @@ def create_client():
         if not isinstance(data['fiscal_month'], int) or not (1 <= data['fiscal_month'] <= 12):
             return jsonify({"error": "Fiscal month must be an integer between 1 and 12"}), 400
 
-        # Check if client ID already exists
-        existing_client = Client.query.get(data['id'])
-        if existing_client:
-            return jsonify({"error": f"Client with No. {data['id']} already exists."}), 409
-
-        # Check if staff_id exists (if you have a Staff model)
-        # staff = Staff.query.get(data['staff_id'])
-        # if not staff:
-        #     return jsonify({"error": f"Staff with ID {data['staff_id']} not found"}), 400
-
-   
-                # Validate accounting method
-        valid_accounting_methods = ['記帳代行', '自計']  # Adjust as needed
-        if data['accounting_method'] not in valid_accounting_methods:
-            return jsonify({"error": f"Invalid accounting method. Must be one of: {', '.join(valid_accounting_methods)}"}), 400
+        # Validate accounting method
+        if data['accounting_method'] not in VALID_ACCOUNTING_METHODS:
+            return jsonify({"error": f"Invalid accounting method. Must be one of: {', '.join(VALID_ACCOUNTING_METHODS)}"}), 400
 
         # statusは任意とし、指定がなければデフォルト値を設定
         status = data.get('status', '未着手')
-        valid_statuses = ['未着手', '依頼中', 'チェック待ち', '作業中', '完了']
-        if status not in valid_statuses:
-            return jsonify({"error": f"Invalid status. Must be one of: {', '.join(valid_statuses)}"}), 400
-
-        # Fetch default tasks based on accounting method
-        default_tasks = DefaultTask.query.filter_by(accounting_method=data['accounting_method']).first()
-        
-        initial_custom_tasks = {}
-        if default_tasks and default_tasks.tasks:
-            current_year = str(datetime.now().year)
-            initial_custom_tasks[current_year] = default_tasks.tasks
-
-        new_client = Client(
-            id=data['id'],
-            name=data['name'].strip(),
-            fiscal_month=data['fiscal_month'],
-            staff_id=data['staff_id'],
-            accounting_method=data['accounting_method'],
-            status=status, # ここで設定
-            custom_tasks_by_year=initial_custom_tasks,
-            finalized_years=[]
-        )
-        
-        print("DEBUG: Before db.session.add(new_client)")
-        db.session.add(new_client)
-        print("DEBUG: Before db.session.commit()")
-        db.session.commit()
-        print("DEBUG: After db.session.commit()")
-        
-        return jsonify(new_client.to_dict()), 201
+        if status not in VALID_CLIENT_STATUSES:
+            return jsonify({"error": f"Invalid status. Must be one of: {', '.join(VALID_CLIENT_STATUSES)}"}), 400
+
+        idempotency_key = request.headers.get('Idempotency-Key') or None
+        if idempotency_key and len(idempotency_key) > 255:
+            return jsonify({"error": "Idempotency-Key must be at most 255 characters"}), 400
+
+        created = upsert_clients([{
+            'id': data['id'],
+            'name': data['name'].strip(),
+            'fiscal_month': data['fiscal_month'],
+            'staff_id': data['staff_id'],
+            'accounting_method': data['accounting_method'],
+            'status': status,
+            # Seed this year's tasks from the (cached) defaults for the accounting method
+            'custom_tasks_by_year': initial_custom_tasks_for(data['accounting_method']),
+            'idempotency_key': idempotency_key,
+        }])
+        if created:
+            response = created[0].to_dict()
+            publish_event('client_created', created[0].id)
+            db.session.commit()
+            return jsonify(response), 201
+
+        # The id or the key is taken; a replay of the same request gets the original client
+        if idempotency_key:
+            existing = Client.query.filter_by(idempotency_key=idempotency_key).first()
+            if existing and str(existing.id) == str(data['id']).strip():
+                return jsonify(existing.to_dict()), 200
+            if existing:
+                return jsonify({"error": f"Idempotency-Key was already used to create client No. {existing.id}"}), 422
+        return jsonify({"error": f"Client with No. {data['id']} already exists."}), 409
 
     except IntegrityError as e:
         db.session.rollback()
-        print(f"DEBUG: Database integrity error in create_client: {e}")
+        print(f"Database integrity error in create_client: {e}")
         return jsonify({"error": "Database constraint violation. Please check your data."}), 409
     
     except Exception as e:
         db.session.rollback()
-        print(f"DEBUG: Top-level error in create_client: {e}")
+        print(f"Error creating client: {e}")
         return jsonify({"error": "Could not create client due to an unexpected error."}), 500
 
+BULK_CLIENT_FIELDS = ('staff_id', 'status', 'is_inactive', 'accounting_method')
+
+def validate_bulk_patch(patch):
+    """Check a bulk field patch; returns an error message or None."""
+    if not isinstance(patch, dict) or not patch:
+        return f"patch must be a non-empty object with any of: {', '.join(BULK_CLIENT_FIELDS)}"
+    unknown = set(patch) - set(BULK_CLIENT_FIELDS)
+    if unknown:
+        return f"Fields cannot be bulk updated: {', '.join(sorted(unknown))}"
+    if 'staff_id' in patch and not (isinstance(patch['staff_id'], int) and db.session.get(Staff, patch['staff_id'])):
+        return f"Staff with ID {patch['staff_id']} not found"
+    if 'status' in patch and patch['status'] not in VALID_CLIENT_STATUSES:
+        return f"Invalid status. Must be one of: {', '.join(VALID_CLIENT_STATUSES)}"
+    if 'accounting_method' in patch and patch['accounting_method'] not in VALID_ACCOUNTING_METHODS:
+        return f"Invalid accounting method. Must be one of: {', '.join(VALID_ACCOUNTING_METHODS)}"
+    if 'is_inactive' in patch and not isinstance(patch['is_inactive'], bool):
+        return "is_inactive must be true or false"
+    return None
+
+def select_clients(data):
+    """Client query for a bulk request body holding either "ids" or "filter".
+
+    Raises ValueError with a user-facing message for a malformed selection.
+    """
+    if ('ids' in data) == ('filter' in data):
+        raise ValueError("Specify exactly one of ids or filter")
+    if 'ids' in data:
+        ids = data['ids']
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            raise ValueError("ids must be a list of client numbers")
+        return Client.query.filter(Client.id.in_(ids))
+    criteria = data['filter']
+    if not isinstance(criteria, dict):
+        raise ValueError("filter must be an object")
+    # A filter that narrows nothing would write to every client
+    if not any(value not in (None, '') for value in criteria.values()):
+        raise ValueError(f"filter needs at least one of: {', '.join(CLIENT_FILTER_KEYS)}")
+    return apply_client_filters(Client.query, criteria, strict=True)
+
+@app.route('/api/clients/bulk', methods=['POST'])
+@bounded_lock_wait
+def bulk_update_clients():
+    """Apply one field patch to many clients in a single UPDATE.
+
+    Body: {"ids": [..]} or {"filter": {same keys as GET /api/clients}},
+          plus {"patch": {"staff_id" | "status" | "is_inactive" | "accounting_method": ..}}
+    Rows that already have the patched values are left alone. Returns
+    {"matched": rows selected, "updated": rows changed}.
+    """
+    from flask import request
 
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Invalid data"}), 400
 
+    try:
+        query = select_clients(data)
+        error = validate_bulk_patch(data.get('patch'))
+        if error:
+            return jsonify({"error": error}), 400
+        patch = data['patch']
+
+        matched = query.count()
+        # Skip rows that would not change so their versions and updated_at stay put
+        changed = query.filter(db.or_(*(
+            getattr(Client, field).is_distinct_from(value) for field, value in patch.items()
+        )))
+        updated = changed.update(
+            {**patch, 'version': Client.version + 1, 'updated_at': datetime.now(timezone.utc)},
+            synchronize_session=False
+        )
+        if updated:
+            publish_event('clients_updated')
+        db.session.commit()
 
-
+        return jsonify({"matched": matched, "updated": updated})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except CONFLICT_ERRORS as e:
+        db.session.rollback()
+        return conflict_response(e)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in bulk client update: {e}")
+        return jsonify({"error": "Could not update clients"}), 500
+
+
+def client_details_dict(client):
+    """Detail payload shared by the client GET and PUT responses."""
+    return {
+        'id': client.id,
+        'name': client.name,
+        'fiscal_month': client.fiscal_month,
+        'staff_id': client.staff_id,
+        'status': client.status,
+        'accounting_method': client.accounting_method,
+        'is_inactive': client.is_inactive,
+        'custom_tasks_by_year': client.custom_tasks_by_year,
+        'finalized_years': client.finalized_years,
+        'monthly_tasks': monthly_task_dicts(client.monthly_tasks),
+        'version': client.version,
+        'updated_at': client.updated_at.astimezone(timezone.utc).isoformat() if client.updated_at else None
+    }
 
 @app.route('/api/clients/<int:client_id>', methods=['GET'])
 def get_client_details(client_id):
     try:
+        task_count = db.select(db.func.count()).where(MonthlyTask.client_id == client_id).scalar_subquery()
+        task_updated_at = db.select(db.func.max(MonthlyTask.updated_at)) \
+            .where(MonthlyTask.client_id == client_id).scalar_subquery()
+        stats = db.session.query(Client.version, Client.updated_at, task_count, task_updated_at) \
+            .filter(Client.id == client_id).first()
+        if not stats:
+            return jsonify({"error": "Client not found"}), 404
+
+        etag = compute_etag('client', client_id, tuple(stats))
+        cached = not_modified_response(etag)
+        if cached:
+            return cached
+
         client = Client.query.get(client_id)
         if not client:
             return jsonify({"error": "Client not found"}), 404
-        
-        client_details = {
-            'id': client.id,
-            'name': client.name,
-            'fiscal_month': client.fiscal_month,
-            'staff_id': client.staff_id,
-            'status': client.status,
-            'accounting_method': client.accounting_method,
-            'is_inactive': client.is_inactive,
-            'custom_tasks_by_year': client.custom_tasks_by_year,
-            'finalized_years': client.finalized_years,
-            'monthly_tasks': [task.to_dict() for task in client.monthly_tasks],
-            'updated_at': client.updated_at.astimezone(timezone.utc).isoformat() if client.updated_at else None
-        }
-        return jsonify(client_details)
+
+        return with_etag(jsonify(client_details_dict(client)), etag)
     except Exception as e:
         print(f"Error fetching client details: {e}")
         return jsonify({"error": "Could not fetch client details"}), 500
 
+def save_monthly_tasks(client, entries, now):
+    """Apply a list of month payloads for one client.
+
+    Every existing row the payload touches is loaded with a single SELECT,
+    checked against the version the caller read, and written back with one
+    executemany UPDATE guarded by "AND version = ?". New months go in with one
+    upsert on (client_id, year_month) so a racing insert of the same month updates it.
+    """
+    # Reject a bad label before anything is written; ValueError names it for the caller
+    for entry in entries:
+        if not entry.get('id') and entry.get('month'):
+            try:
+                parse_year_month(entry['month'])
+            except (ValueError, AttributeError):
+                raise ValueError(f"Invalid month label: {entry['month']!r}. Use YYYY年M月")
+
+    task_ids = {entry['id'] for entry in entries if entry.get('id')}
+    year_months = {parse_year_month(entry['month']) for entry in entries if not entry.get('id') and entry.get('month')}
+    if not task_ids and not year_months:
+        return
+
+    existing = MonthlyTask.query.filter(
+        MonthlyTask.client_id == client.id,
+        db.or_(MonthlyTask.id.in_(task_ids), MonthlyTask.year_month.in_(year_months))
+    ).all()
+    by_id = {task.id: task for task in existing}
+    by_year_month = {task.year_month: task for task in existing}
+
+    updates = {}
+    new_rows = {}
+    task_states = {}  # year_month -> tasks map, for task_statuses
+    for entry in entries:
+        if entry.get('id'):
+            task = by_id.get(entry['id'])
+        elif entry.get('month'):
+            # A month saved without its id (e.g. a retried autosave) updates the existing row
+            task = by_year_month.get(parse_year_month(entry['month']))
+        else:
+            continue
+
+        if task:
+            check_version(task, entry)
+            if 'tasks' in entry:
+                task_states[task.year_month] = entry['tasks']
+            updates[task.id] = {
+                'b_id': task.id,
+                'b_version': task.version,
+                'b_tasks': entry.get('tasks', task.tasks),
+                'b_status': entry.get('status', task.status),
+                'b_memo': entry.get('memo', task.memo),
+                'b_url': entry.get('url', task.url),
+            }
+        elif not entry.get('id') and (entry.get('tasks') or entry.get('memo') or entry.get('url')):
+            year_month = parse_year_month(entry['month'])
+            task_states[year_month] = entry.get('tasks', {})
+            new_rows[year_month] = {
+                'client_id': client.id,
+                'month': entry['month'],
+                'year_month': year_month,
+                'tasks': entry.get('tasks', {}),
+                'status': entry.get('status'),
+                'memo': entry.get('memo', ''),
+                'url': entry.get('url', ''),
+                'version': 1,
+                'updated_at': now,
+            }
+
+    if updates:
+        # The ORM flushes versioned rows one UPDATE at a time, so batch them in Core
+        table = MonthlyTask.__table__
+        result = db.session.execute(
+            table.update()
+            .where(table.c.id == db.bindparam('b_id'), table.c.version == db.bindparam('b_version'))
+            .values(
+                tasks=db.bindparam('b_tasks', type_=table.c.tasks.type),
+                status=db.bindparam('b_status'),
+                memo=db.bindparam('b_memo'),
+                url=db.bindparam('b_url'),
+                version=table.c.version + 1,
+                updated_at=now,
+            ),
+            list(updates.values())
+        )
+        if result.rowcount != len(updates):
+            raise VersionConflict(f"monthly tasks of client {client.id} changed while saving")
+        # Reloaded with the response's single collection load
+        for task in existing:
+            db.session.expire(task)
+
+    if new_rows:
+        stmt = dialect_insert(MonthlyTask)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MonthlyTask.client_id, MonthlyTask.year_month],
+            set_={
+                'tasks': stmt.excluded.tasks,
+                'status': db.func.coalesce(stmt.excluded.status, MonthlyTask.status),
+                'memo': stmt.excluded.memo,
+                'url': stmt.excluded.url,
+                'version': MonthlyTask.version + 1,
+                'updated_at': stmt.excluded.updated_at,
+            }
+        )
+        # RETURNING the entities puts the new rows in the identity map for the response
+        db.session.scalars(stmt.returning(MonthlyTask), list(new_rows.values())).all()
+
+    if task_states and TASK_STATUS_STORAGE == 'table':
+        replace_task_states(client.id, task_states, now)
+    elif task_states:
+        mirror_task_statuses(MonthlyTask.client_id == client.id, MonthlyTask.year_month.in_(list(task_states)))
+
 @app.route('/api/clients/<int:client_id>', methods=['PUT'])
+@bounded_lock_wait
 def update_client_details(client_id):
     from flask import request
     from datetime import datetime, timezone
@@ -304,14 +1451,11 @@ def update_client_details(client_id):
     if not data:
         return jsonify({"error": "Invalid data"}), 400
 
-    # --- Pessimistic Locking Implementation ---
     try:
-        # Use pessimistic locking to prevent concurrent modifications
-        client = Client.query.filter_by(id=client_id).with_for_update().first()
+        client = lock_client(client_id)
         if not client:
             return jsonify({"error": "Client not found"}), 404
-
-        print(f"DEBUG: Acquired pessimistic lock for client {client_id}")
+        check_version(client, data)
 
         # --- Update Logic ---
         # Update client's own fields
@@ -325,44 +1469,291 @@ def update_client_details(client_id):
         client.finalized_years = data.get('finalized_years', client.finalized_years)
         flag_modified(client, "finalized_years")
 
-        # Update monthly tasks
-        if 'monthly_tasks' in data:
-            for task_data in data['monthly_tasks']:
-                task_id = task_data.get('id')
-                if task_id:
-                    # Use pessimistic locking for monthly tasks as well
-                    task = MonthlyTask.query.filter_by(id=task_id).with_for_update().first()
-                    if task and task.client_id == client.id:
-                        task.tasks = task_data.get('tasks', task.tasks)
-                        flag_modified(task, "tasks")
-                        task.status = task_data.get('status', task.status)
-                        task.memo = task_data.get('memo', task.memo)
-                        task.url = task_data.get('url', task.url)
-                else:
-                    if task_data.get('tasks') or task_data.get('memo') or task_data.get('url'):
-                        new_task = MonthlyTask(
-                            client_id=client.id,
-                            month=task_data['month'],
-                            tasks=task_data.get('tasks', {}),
-                            memo=task_data.get('memo', ''),
-                            url=task_data.get('url', '')
-                        )
-                        db.session.add(new_task)
-        
         # Explicitly touch the client to ensure its updated_at is changed
-        client.updated_at = datetime.now(timezone.utc)
+        now = datetime.now(timezone.utc)
+        client.updated_at = now
 
+        # Update monthly tasks
+        if data.get('monthly_tasks'):
+            save_monthly_tasks(client, data['monthly_tasks'], now)
+
+        refresh_progress_summary([client.id])
+        # Build the response from the session before commit expires it
+        client_details = client_details_dict(client)
+        publish_event('client_updated', client.id)
         db.session.commit()
 
-        # Return the updated client data using the same format as get_client_details
-        updated_client = Client.query.get(client_id)
-        return get_client_details(client_id)
+        return jsonify(client_details)
 
+    except CONFLICT_ERRORS as e:
+        db.session.rollback()
+        return conflict_response(e)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         print(f"Error updating client details: {e}")
         return jsonify({"error": "Could not update client details"}), 500
 
+def parse_year_month_param(value):
+    """Parse a year-month URL segment: '2025-04', '202504' or the '2025年4月' label."""
+    value = value.strip()
+    for fmt in ('%Y-%m', '%Y%m'):
+        try:
+            parsed = datetime.strptime(value, fmt)
+            return parsed.year * 100 + parsed.month
+        except ValueError:
+            pass
+    return parse_year_month(value)
+
+def merge_task_states(current_tasks, changes):
+    """Apply a {task name: checked | {checked, note}} delta to a month's tasks map."""
+    merged = dict(current_tasks or {})
+    for name, change in changes.items():
+        current = merged.get(name)
+        if isinstance(current, dict):
+            state = dict(current)
+        else:
+            # Legacy rows store a bare boolean per task
+            state = {'checked': bool(current), 'note': ''}
+        if isinstance(change, dict):
+            state.update({key: change[key] for key in ('checked', 'note') if key in change})
+        else:
+            state['checked'] = bool(change)
+        merged[name] = state
+    return merged
+
+def validate_task_changes(changes):
+    """Check a {task name: checked | {checked, note}} delta; returns an error message or None."""
+    if not isinstance(changes, dict):
+        return "tasks must be an object"
+    for name, change in changes.items():
+        if isinstance(change, bool):
+            continue
+        if not isinstance(change, dict) or set(change) - {'checked', 'note'}:
+            return f"Task '{name}' must be true/false or an object with checked and note"
+        if 'checked' in change and not isinstance(change['checked'], bool):
+            return f"Task '{name}': checked must be true or false"
+        if 'note' in change and not isinstance(change['note'], (str, type(None))):
+            return f"Task '{name}': note must be a string"
+    return None
+
+@app.route('/api/clients/<int:client_id>/monthly-tasks/<year_month>', methods=['PATCH'])
+@bounded_lock_wait
+def patch_monthly_task(client_id, year_month):
+    """Update a single month's checkboxes, memo, url or status without resending the client.
+
+    Body: {"tasks": {name: checked | {"checked": .., "note": ..}}, "memo": .., "url": .., "status": ..,
+           "version": ..}
+    Only the given keys change; a stale "version" is rejected with 409.
+    Returns the month row and the client's new updated_at and version.
+    """
+    from flask import request
+
+    data = request.get_json()
+    if not data or not isinstance(data, dict):
+        return jsonify({"error": "Invalid data"}), 400
+    if 'tasks' in data:
+        error = validate_task_changes(data['tasks'])
+        if error:
+            return jsonify({"error": error}), 400
+    try:
+        year_month = parse_year_month_param(year_month)
+    except ValueError:
+        return jsonify({"error": "Invalid year-month. Use YYYY-MM"}), 400
+
+    try:
+        if not lock_client(client_id):
+            return jsonify({"error": "Client not found"}), 404
+
+        month_query = MonthlyTask.query.filter_by(client_id=client_id, year_month=year_month)
+        task = month_query.first()
+        if not task:
+            # Create the month if needed; a concurrent creator wins harmlessly
+            db.session.execute(
+                dialect_insert(MonthlyTask).values(
+                    client_id=client_id, month=format_year_month(year_month), year_month=year_month,
+                    tasks={}, memo='', url=''
+                ).on_conflict_do_nothing(index_elements=['client_id', 'year_month'])
+            )
+            task = month_query.first()
+        check_version(task, data)
+
+        now = datetime.now(timezone.utc)
+        if 'tasks' in data and TASK_STATUS_STORAGE == 'table':
+            # Each ticked box is a single-row upsert; the JSON document is left alone
+            upsert_task_states(client_id, year_month, data['tasks'], now)
+        elif 'tasks' in data:
+            task.tasks = merge_task_states(task.tasks, data['tasks'])
+        for field in ('memo', 'url', 'status'):
+            if field in data:
+                setattr(task, field, data[field])
+        task.updated_at = now
+
+        # The month is part of the client, so the client's version moves with it
+        client_version = db.session.scalar(
+            db.update(Client).where(Client.id == client_id)
+            .values(updated_at=now, version=Client.version + 1).returning(Client.version),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.flush()
+        if 'tasks' in data:
+            mirror_task_statuses(MonthlyTask.id == task.id)
+        if 'status' in data:
+            refresh_progress_summary([client_id])
+        monthly_task = monthly_task_dicts([task])[0]
+        publish_event('client_updated', client_id)
+        db.session.commit()
+
+        return jsonify({
+            "monthly_task": monthly_task,
+            "client_updated_at": now.isoformat(),
+            "version": client_version
+        })
+    except CONFLICT_ERRORS as e:
+        db.session.rollback()
+        return conflict_response(e)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error updating monthly task: {e}")
+        return jsonify({"error": "Could not update monthly task"}), 500
+
+def close_month(clients, year_month, task_names=None):
+    """Mark `task_names` checked, or the whole month '月次完了', for every client in `clients`.
+
+    `clients` is a Client query; no rows are loaded into the session. Missing
+    month rows are created with one INSERT ... SELECT, then updated with one
+    UPDATE, and the progress summary is refreshed. Returns (created, updated);
+    the caller commits.
+    """
+    now = datetime.now(timezone.utc)
+    client_ids = clients.with_entities(Client.id).statement
+
+    new_rows = clients.with_entities(
+        Client.id,
+        db.literal(format_year_month(year_month)),
+        db.literal(year_month),
+        db.literal({}, MonthlyTask.tasks.type),
+        db.literal(''),
+        db.literal(''),
+        db.literal(now, MonthlyTask.updated_at.type),
+    ).filter(db.true()).statement  # SQLite needs a WHERE before ON CONFLICT in INSERT ... SELECT
+    created = db.session.execute(
+        dialect_insert(MonthlyTask)
+        .from_select(['client_id', 'month', 'year_month', 'tasks', 'memo', 'url', 'updated_at'], new_rows)
+        .on_conflict_do_nothing(index_elements=['client_id', 'year_month'])
+    ).rowcount
+
+    values = {'version': MonthlyTask.version + 1, 'updated_at': now}
+    if task_names and TASK_STATUS_STORAGE == 'table':
+        for name in task_names:
+            checked_rows = clients.with_entities(
+                Client.id, db.literal(year_month), db.literal(name), db.literal(True), db.literal(''),
+                db.literal(now, TaskStatus.updated_at.type),
+            ).filter(db.true()).statement
+            stmt = dialect_insert(TaskStatus).from_select(
+                ['client_id', 'year_month', 'task_name', 'done', 'note', 'updated_at'], checked_rows)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['client_id', 'year_month', 'task_name'],
+                set_={'done': True, 'updated_at': stmt.excluded.updated_at}
+            ))
+    elif task_names:
+        values['tasks'] = json_tasks_checked(MonthlyTask.tasks, task_names)
+    else:
+        values['status'] = '月次完了'
+    month_rows = (MonthlyTask.year_month == year_month, MonthlyTask.client_id.in_(client_ids))
+    updated = db.session.execute(
+        db.update(MonthlyTask).where(*month_rows).values(**values),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    if task_names:
+        mirror_task_statuses(*month_rows)
+
+    db.session.execute(
+        db.update(Client).where(Client.id.in_(client_ids)).values(updated_at=now),
+        execution_options={'synchronize_session': False}
+    )
+    if not task_names:
+        refresh_progress_summary(client_ids)
+    return created, updated
+
+@app.route('/api/clients/month-close', methods=['POST'])
+@bounded_lock_wait
+def month_close():
+    """Close one month for many clients at once.
+
+    Body: {"year_month": "2025-04", "ids": [..] | "filter": {..}, "tasks": [task names]}
+    With "tasks" only those tasks are checked; without it the month is set to '月次完了'.
+    Returns {"created": new month rows, "updated": month rows changed}.
+    """
+    from flask import request
+
+    data = request.get_json()
+    if not data or not data.get('year_month'):
+        return jsonify({"error": "year_month is required"}), 400
+
+    try:
+        clients = select_clients(data)
+        year_month = parse_year_month_param(str(data['year_month']))
+        task_names = data.get('tasks')
+        if task_names is not None and (not isinstance(task_names, list) or not task_names
+                                       or not all(isinstance(name, str) and name for name in task_names)):
+            return jsonify({"error": "tasks must be a non-empty list of task names"}), 400
+
+        created, updated = close_month(clients, year_month, task_names)
+        if created or updated:
+            publish_event('clients_updated')
+        db.session.commit()
+        return jsonify({"created": created, "updated": updated})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except CONFLICT_ERRORS as e:
+        db.session.rollback()
+        return conflict_response(e)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error closing month: {e}")
+        return jsonify({"error": "Could not close month"}), 500
+
+@app.route('/api/clients/by-task', methods=['GET'])
+def get_clients_by_task():
+    """Clients whose task is (not) checked for one month, e.g. ?task=担当チェック&year_month=2025-05.
+
+    done=false (default) lists clients without the task checked, including those
+    with no row for the month; done=true lists those with it checked. Accepts the
+    same filters as GET /api/clients. The task test runs in the database, served
+    by the GIN index on monthly_tasks.tasks on PostgreSQL (or the task_statuses
+    index in 'table' mode).
+    """
+    from flask import request
+    task = request.args.get('task')
+    if not task or not request.args.get('year_month'):
+        return jsonify({"error": "task and year_month are required"}), 400
+    try:
+        year_month = parse_year_month_param(request.args['year_month'])
+        done = parse_bool_param(request.args, 'done') or False
+
+        if TASK_STATUS_STORAGE == 'table':
+            done_clients = db.select(TaskStatus.client_id).where(
+                TaskStatus.year_month == year_month, TaskStatus.task_name == task, TaskStatus.done.is_(True)
+            )
+        else:
+            done_clients = db.select(MonthlyTask.client_id).where(
+                MonthlyTask.year_month == year_month, json_task_done(MonthlyTask.tasks, task)
+            )
+        query = apply_client_filters(Client.query.join(Client.staff), request.args) \
+            .options(contains_eager(Client.staff)) \
+            .filter(Client.id.in_(done_clients) if done else Client.id.not_in(done_clients)) \
+            .order_by(Client.id)
+        return stream_json_array(query, Client.to_dict)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error fetching clients by task: {e}")
+        return jsonify({"error": "Could not fetch clients"}), 500
+
 def staff_to_dict(staff):
     """Converts a Staff object to a dictionary."""
     return {'id': staff.id, 'name': staff.name}
@@ -370,8 +1761,11 @@ def staff_to_dict(staff):
 @app.route('/api/staffs', methods=['GET'])
 def get_staffs():
     try:
-        staffs = Staff.query.order_by(Staff.id).all()
-        return jsonify([staff_to_dict(s) for s in staffs])
+        staffs, etag = cached_reference_data('staffs', load_staffs)
+        cached = not_modified_response(etag)
+        if cached:
+            return cached
+        return with_etag(jsonify(staffs), etag)
     except Exception as e:
         print(f"Error fetching staffs: {e}")
         return jsonify({"error": "Could not fetch staffs"}), 500
@@ -393,6 +1787,7 @@ def create_staff():
     try:
         new_staff = Staff(name=new_name)
         db.session.add(new_staff)
+        invalidate_reference_cache('staffs')
         db.session.commit()
         return jsonify(staff_to_dict(new_staff)), 201
     except Exception as e:
@@ -413,6 +1808,7 @@ def delete_staff(staff_id):
 
     try:
         db.session.delete(staff)
+        invalidate_reference_cache('staffs')
         db.session.commit()
         return jsonify({"message": "Staff deleted successfully"}), 200
     except Exception as e:
@@ -441,6 +1837,8 @@ def update_staff(staff_id):
 
     try:
         staff.name = new_name
+        staff.updated_at = datetime.now(timezone.utc)
+        invalidate_reference_cache('staffs')
         db.session.commit()
         return jsonify(staff_to_dict(staff)), 200
     except Exception as e:
@@ -454,8 +1852,11 @@ def update_staff(staff_id):
 @app.route('/api/default-tasks', methods=['GET'])
 def get_default_tasks():
     try:
-        defaults = DefaultTask.query.all()
-        return jsonify({d.accounting_method: d.tasks for d in defaults})
+        default_tasks, etag = cached_reference_data('default_tasks', load_default_tasks)
+        cached = not_modified_response(etag)
+        if cached:
+            return cached
+        return with_etag(jsonify(default_tasks), etag)
     except Exception as e:
         print(f"Error fetching default tasks: {e}")
         return jsonify({"error": "Could not fetch default tasks"}), 500
@@ -473,11 +1874,13 @@ def update_default_tasks():
             if default_task_entry:
                 default_task_entry.tasks = tasks
                 flag_modified(default_task_entry, "tasks")
+                default_task_entry.updated_at = datetime.now(timezone.utc)
             else:
                 # This case should ideally not happen if DB is seeded
                 new_default = DefaultTask(accounting_method=method, tasks=tasks)
                 db.session.add(new_default)
         
+        invalidate_reference_cache('default_tasks')
         db.session.commit()
         return jsonify({"message": "Default tasks updated successfully"}), 200
     except Exception as e:
@@ -485,14 +1888,98 @@ def update_default_tasks():
         print(f"Error updating default tasks: {e}")
         return jsonify({"error": "Could not update default tasks"}), 500
 
+def rollout_default_tasks(accounting_method, years, tasks, dry_run=False):
+    """Set custom_tasks_by_year[year] = tasks for every client of `accounting_method`.
+
+    Years a client has finalized, and years already holding exactly `tasks`,
+    are skipped. One UPDATE (or COUNT for a dry run) per year, no rows loaded.
+    Returns ({year: clients changed}, distinct clients changed); the caller commits.
+    """
+    def would_change(year):
+        return db.and_(
+            Client.accounting_method == accounting_method,
+            db.not_(json_array_contains(Client.finalized_years, year)),
+            json_object_value_differs(Client.custom_tasks_by_year, year, tasks),
+        )
+
+    clients = db.session.query(db.func.count(Client.id)) \
+        .filter(db.or_(*(would_change(year) for year in years))).scalar()
+    per_year = {}
+    now = datetime.now(timezone.utc)
+    for year in years:
+        if dry_run:
+            per_year[year] = db.session.query(db.func.count(Client.id)).filter(would_change(year)).scalar()
+            continue
+        per_year[year] = db.session.execute(
+            db.update(Client).where(would_change(year)).values(
+                custom_tasks_by_year=json_object_set(Client.custom_tasks_by_year, year, tasks),
+                version=Client.version + 1,
+                updated_at=now,
+            ),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+    return per_year, clients
+
+@app.route('/api/default-tasks/rollout', methods=['POST'])
+@bounded_lock_wait
+def rollout_default_tasks_endpoint():
+    """Push an accounting method's default tasks to existing clients' unfinalized years.
+
+    Body: {"accounting_method": "記帳代行", "years": ["2025", ..], "tasks": [..] (default: the
+    saved default tasks), "dry_run": true}. Returns per-year and total changed client counts.
+    """
+    from flask import request
+
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Invalid data"}), 400
+    accounting_method = data.get('accounting_method')
+    if accounting_method not in VALID_ACCOUNTING_METHODS:
+        return jsonify({"error": f"Invalid accounting method. Must be one of: {', '.join(VALID_ACCOUNTING_METHODS)}"}), 400
+    years = data.get('years')
+    if not isinstance(years, list) or not years or not all(str(year).isdigit() and len(str(year)) == 4 for year in years):
+        return jsonify({"error": "years must be a non-empty list like [\"2025\", \"2026\"]"}), 400
+    years = [str(year) for year in years]
+
+    try:
+        tasks = data.get('tasks')
+        if tasks is None:
+            default_tasks, _ = cached_reference_data('default_tasks', load_default_tasks)
+            tasks = default_tasks.get(accounting_method)
+        if not isinstance(tasks, list) or not tasks:
+            return jsonify({"error": "No tasks to roll out"}), 400
+
+        dry_run = bool(data.get('dry_run'))
+        per_year, clients = rollout_default_tasks(accounting_method, years, tasks, dry_run)
+        if dry_run:
+            db.session.rollback()
+        else:
+            if clients:
+                publish_event('clients_updated')
+            db.session.commit()
+        return jsonify({"dry_run": dry_run, "clients": clients, "years": per_year, "tasks": tasks})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except CONFLICT_ERRORS as e:
+        db.session.rollback()
+        return conflict_response(e)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error rolling out default tasks: {e}")
+        return jsonify({"error": "Could not roll out default tasks"}), 500
+
 
 # --- Settings Management API ---
 
 @app.route('/api/settings', methods=['GET'])
 def get_settings():
     try:
-        settings = Setting.query.all()
-        return jsonify({s.key: s.value for s in settings})
+        settings, etag = cached_reference_data('settings', load_settings)
+        cached = not_modified_response(etag)
+        if cached:
+            return cached
+        return with_etag(jsonify(settings), etag)
     except Exception as e:
         print(f"Error fetching settings: {e}")
         return jsonify({"error": "Could not fetch settings"}), 500
@@ -510,11 +1997,13 @@ def update_settings():
             if setting_entry:
                 setting_entry.value = value
                 flag_modified(setting_entry, "value")
+                setting_entry.updated_at = datetime.now(timezone.utc)
             else:
                 # Create new setting if it doesn't exist
                 new_setting = Setting(key=key, value=value)
                 db.session.add(new_setting)
         
+        invalidate_reference_cache('settings')
         db.session.commit()
         return jsonify({"message": "Settings updated successfully"}), 200
     except Exception as e:
@@ -529,6 +2018,7 @@ def hello_world():
 
 # --- Custom Tasks Management API ---
 @app.route('/api/clients/<int:client_id>/custom-tasks/<year>', methods=['PUT'])
+@bounded_lock_wait
 def update_custom_tasks_for_year(client_id, year):
     from flask import request
     from datetime import datetime, timezone
@@ -538,10 +2028,10 @@ def update_custom_tasks_for_year(client_id, year):
         return jsonify({"error": "Invalid data"}), 400
     
     try:
-        # Use pessimistic locking for custom tasks update
-        client = Client.query.filter_by(id=client_id).with_for_update().first()
+        client = lock_client(client_id)
         if not client:
             return jsonify({"error": "Client not found"}), 404
+        check_version(client, data)
         # Initialize custom_tasks_by_year if it doesn't exist
         if not client.custom_tasks_by_year:
             client.custom_tasks_by_year = {}
@@ -553,15 +2043,20 @@ def update_custom_tasks_for_year(client_id, year):
         
         # Update timestamp
         client.updated_at = datetime.now(timezone.utc)
+        publish_event('client_updated', client_id)
         
         db.session.commit()
         
         return jsonify({
             "message": "Custom tasks updated successfully",
             "year": year,
-            "custom_tasks": custom_tasks
+            "custom_tasks": custom_tasks,
+            "version": client.version
         })
         
+    except CONFLICT_ERRORS as e:
+        db.session.rollback()
+        return conflict_response(e)
     except Exception as e:
         db.session.rollback()
         print(f"Error updating custom tasks: {e}")
@@ -606,7 +2101,40 @@ def sync_check_custom_tasks(client_id):
         "db_tasks_by_year": db_tasks_by_year
     })
 
+def remove_task_keys(task_names, *criteria):
+    """Delete `task_names` from the tasks map of every MonthlyTask matching `criteria`.
+
+    Runs as one UPDATE inside the database (plus one DELETE when task_statuses
+    is kept) and only touches rows holding one of the names. Returns
+    {task id: new version} for the changed rows.
+    """
+    values = {'version': MonthlyTask.version + 1, 'updated_at': datetime.now(timezone.utc)}
+    if TASK_STATUS_STORAGE == 'table':
+        present = db.tuple_(MonthlyTask.client_id, MonthlyTask.year_month).in_(
+            db.select(TaskStatus.client_id, TaskStatus.year_month).where(TaskStatus.task_name.in_(task_names))
+        )
+    else:
+        values['tasks'], present = json_tasks_without(MonthlyTask.tasks, task_names)
+    result = db.session.execute(
+        db.update(MonthlyTask).where(present, *criteria).values(**values)
+        .returning(MonthlyTask.id, MonthlyTask.version),
+        execution_options={'synchronize_session': False}
+    )
+    versions = dict(result.all())
+
+    if task_status_table_enabled():
+        db.session.execute(
+            db.delete(TaskStatus).where(
+                TaskStatus.task_name.in_(task_names),
+                db.tuple_(TaskStatus.client_id, TaskStatus.year_month).in_(
+                    db.select(MonthlyTask.client_id, MonthlyTask.year_month).where(*criteria))
+            ),
+            execution_options={'synchronize_session': False}
+        )
+    return versions
+
 @app.route('/api/clients/<int:client_id>/cleanup-deleted-tasks', methods=['POST'])
+@bounded_lock_wait
 def cleanup_deleted_tasks(client_id):
     from flask import request
     from datetime import datetime, timezone
@@ -616,51 +2144,83 @@ def cleanup_deleted_tasks(client_id):
         return jsonify({"error": "Invalid data"}), 400
     
     try:
-        # Use pessimistic locking for cleanup operation
-        client = Client.query.filter_by(id=client_id).with_for_update().first()
+        client = lock_client(client_id)
         if not client:
             return jsonify({"error": "Client not found"}), 404
+        check_version(client, data)
         year = data.get('year')
         deleted_tasks = data.get('deleted_tasks', [])
         
         if not year or not deleted_tasks:
             return jsonify({"error": "Year and deleted_tasks are required"}), 400
         
-        cleaned_count = 0
-        
-        # Remove deleted tasks from all monthly_tasks for this client
-        # Use pessimistic locking for monthly tasks as well
-        monthly_tasks = MonthlyTask.query.filter_by(client_id=client_id).with_for_update().all()
-        
-        for monthly_task in monthly_tasks:
-            if monthly_task.tasks:
-                original_tasks = monthly_task.tasks.copy()
-                for deleted_task in deleted_tasks:
-                    if deleted_task in monthly_task.tasks:
-                        del monthly_task.tasks[deleted_task]
-                        cleaned_count += 1
-                
-                # Mark the field as modified if changes were made
-                if original_tasks != monthly_task.tasks:
-                    flag_modified(monthly_task, "tasks")
+        # Remove deleted tasks from all monthly_tasks for this client in one UPDATE
+        versions = remove_task_keys(deleted_tasks, MonthlyTask.client_id == client_id)
         
         # Update timestamp
         client.updated_at = datetime.now(timezone.utc)
-        
+        db.session.flush()
+        client_version = client.version
+        publish_event('client_updated', client_id)
         db.session.commit()
         
         return jsonify({
-            "message": f"Cleaned up {cleaned_count} deleted task references",
+            "message": f"Cleaned up deleted tasks in {len(versions)} months",
             "deleted_tasks": deleted_tasks,
-            "year": year
+            "year": year,
+            "version": client_version,
+            "monthly_task_versions": versions
         })
         
+    except CONFLICT_ERRORS as e:
+        db.session.rollback()
+        return conflict_response(e)
     except Exception as e:
         db.session.rollback()
         print(f"Error cleaning up deleted tasks: {e}")
         return jsonify({"error": "Could not cleanup deleted tasks"}), 500
 
+@app.route('/api/tasks/retire', methods=['POST'])
+@bounded_lock_wait
+def retire_tasks():
+    """Remove retired task names from every client's monthly history in one pass.
+
+    Body: {"tasks": [names], "accounting_method": optional scope}
+    Returns the number of month rows changed.
+    """
+    from flask import request
+
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Invalid data"}), 400
+    task_names = data.get('tasks')
+    if not isinstance(task_names, list) or not task_names or not all(isinstance(name, str) and name for name in task_names):
+        return jsonify({"error": "tasks must be a non-empty list of task names"}), 400
+
+    try:
+        criteria = []
+        if data.get('accounting_method'):
+            criteria.append(MonthlyTask.client_id.in_(
+                db.select(Client.id).where(Client.accounting_method == data['accounting_method'])
+            ))
+        updated = len(remove_task_keys(task_names, *criteria))
+        if updated:
+            publish_event('clients_updated')
+        db.session.commit()
+        return jsonify({"tasks": task_names, "updated": updated})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except CONFLICT_ERRORS as e:
+        db.session.rollback()
+        return conflict_response(e)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error retiring tasks: {e}")
+        return jsonify({"error": "Could not retire tasks"}), 500
+
 @app.route('/api/clients/<int:client_id>/propagate-tasks', methods=['POST'])
+@bounded_lock_wait
 def propagate_tasks_to_future_years(client_id):
     from flask import request
     from datetime import datetime, timezone
@@ -670,10 +2230,10 @@ def propagate_tasks_to_future_years(client_id):
         return jsonify({"error": "Invalid data"}), 400
     
     try:
-        # Use pessimistic locking for propagate operation
-        client = Client.query.filter_by(id=client_id).with_for_update().first()
+        client = lock_client(client_id)
         if not client:
             return jsonify({"error": "Client not found"}), 404
+        check_version(client, data)
         source_year = data.get('source_year')
         target_years = data.get('target_years', [])
         
@@ -711,6 +2271,7 @@ def propagate_tasks_to_future_years(client_id):
         
         flag_modified(client, "custom_tasks_by_year")
         client.updated_at = datetime.now(timezone.utc)
+        publish_event('client_updated', client_id)
         
         db.session.commit()
         
@@ -718,20 +2279,335 @@ def propagate_tasks_to_future_years(client_id):
             "message": f"Tasks propagated to {len(propagated_to)} years",
             "source_year": source_year,
             "propagated_to": propagated_to,
-            "tasks": source_tasks
+            "tasks": source_tasks,
+            "version": client.version
         })
         
+    except CONFLICT_ERRORS as e:
+        db.session.rollback()
+        return conflict_response(e)
     except Exception as e:
         db.session.rollback()
         print(f"Error propagating tasks: {e}")
         return jsonify({"error": "Could not propagate tasks"}), 500
 
+# --- Editing Session Store ---
+# Presence of editors on a client's details page. Heartbeats and status checks
+# are frequent and short-lived, so the store is pluggable (EDITING_SESSION_STORE):
+#   'database' - the editing_sessions table on the primary database (default)
+#   'memory'   - a dict in this process; single-worker deployments and tests
+#   'sqlite'   - a local SQLite file shared by all workers on one host
+# Sessions are returned as dicts with timezone-aware UTC timestamps. A session
+# whose last_activity is older than the TTL counts as gone; nothing is purged
+# on the read path.
+
+class EditingSessionStore(abc.ABC):
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    @abc.abstractmethod
+    def claim(self, client_id, user_id):
+        """Start (or refresh) user_id's session unless another live one exists; returns the live session."""
+
+    @abc.abstractmethod
+    def touch(self, client_id, user_id):
+        """Refresh user_id's session; False when it has none."""
+
+    @abc.abstractmethod
+    def release(self, client_id, user_id):
+        """End user_id's session; False when it had none."""
+
+    @abc.abstractmethod
+    def get(self, client_id):
+        """The live session for a client, or None."""
+
+    @abc.abstractmethod
+    def get_many(self, client_ids=None):
+        """Live sessions keyed by client id, for the given clients or all of them."""
+
+    @abc.abstractmethod
+    def clear(self, client_id):
+        """Drop every session for a client; returns how many were removed."""
+
+    @abc.abstractmethod
+    def purge_expired(self):
+        """Drop every expired session; returns how many were removed."""
+
+class DatabaseEditingSessionStore(EditingSessionStore):
+    """editing_sessions table; writes join the request's transaction, so callers commit."""
+
+    @staticmethod
+    def _now():
+        # Stored as naive UTC so the TTL comparison never depends on the server's timezone
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    @staticmethod
+    def _to_dict(row):
+        return {
+            'client_id': row.client_id,
+            'user_id': row.user_id,
+            'started_at': row.started_at.replace(tzinfo=timezone.utc),
+            'last_activity': row.last_activity.replace(tzinfo=timezone.utc),
+        }
+
+    def _live(self, client_id, now):
+        return EditingSession.query.filter(
+            EditingSession.client_id == client_id,
+            EditingSession.last_activity >= now - self.ttl
+        ).first()
+
+    def claim(self, client_id, user_id):
+        now = self._now()
+        stmt = dialect_insert(EditingSession).values(
+            client_id=client_id, user_id=user_id, started_at=now, last_activity=now)
+        # Takes the client's row over only when it is ours or expired; the probe reports whoever holds it
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[EditingSession.client_id],
+            set_={
+                'user_id': stmt.excluded.user_id,
+                'started_at': db.case(
+                    (EditingSession.user_id == stmt.excluded.user_id, EditingSession.started_at),
+                    else_=stmt.excluded.started_at),
+                'last_activity': stmt.excluded.last_activity,
+            },
+            where=db.or_(EditingSession.user_id == stmt.excluded.user_id,
+                         EditingSession.last_activity < now - self.ttl)
+        )
+        db.session.execute(stmt)
+        return self._to_dict(EditingSession.query.filter_by(client_id=client_id).populate_existing().one())
+
+    def touch(self, client_id, user_id):
+        return EditingSession.query.filter_by(client_id=client_id, user_id=user_id).update(
+            {'last_activity': self._now()}, synchronize_session=False) > 0
+
+    def release(self, client_id, user_id):
+        return EditingSession.query.filter_by(client_id=client_id, user_id=user_id).delete() > 0
+
+    def get(self, client_id):
+        session = self._live(client_id, self._now())
+        return self._to_dict(session) if session else None
+
+    def get_many(self, client_ids=None):
+        query = EditingSession.query.filter(EditingSession.last_activity >= self._now() - self.ttl)
+        if client_ids is not None:
+            query = query.filter(EditingSession.client_id.in_(client_ids))
+        return {session.client_id: self._to_dict(session) for session in query}
+
+    def clear(self, client_id):
+        return EditingSession.query.filter_by(client_id=client_id).delete()
+
+    def purge_expired(self):
+        return EditingSession.query.filter(EditingSession.last_activity < self._now() - self.ttl).delete()
+
+class MemoryEditingSessionStore(EditingSessionStore):
+    """Per-process dict; every worker sees only its own sessions."""
+
+    def __init__(self, ttl):
+        super().__init__(ttl)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _live(self, client_id, now):
+        session = self._sessions.get(client_id)
+        if session and session['last_activity'] < now - self.ttl:
+            del self._sessions[client_id]
+            return None
+        return session
+
+    def claim(self, client_id, user_id):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            session = self._live(client_id, now)
+            if session and session['user_id'] != user_id:
+                return dict(session)
+            if session:
+                session['last_activity'] = now
+            else:
+                session = self._sessions[client_id] = {
+                    'client_id': client_id, 'user_id': user_id, 'started_at': now, 'last_activity': now}
+            return dict(session)
+
+    def touch(self, client_id, user_id):
+        with self._lock:
+            session = self._sessions.get(client_id)
+            if not session or session['user_id'] != user_id:
+                return False
+            session['last_activity'] = datetime.now(timezone.utc)
+            return True
+
+    def release(self, client_id, user_id):
+        with self._lock:
+            session = self._sessions.get(client_id)
+            if not session or session['user_id'] != user_id:
+                return False
+            del self._sessions[client_id]
+            return True
+
+    def get(self, client_id):
+        with self._lock:
+            session = self._live(client_id, datetime.now(timezone.utc))
+            return dict(session) if session else None
+
+    def get_many(self, client_ids=None):
+        cutoff = datetime.now(timezone.utc) - self.ttl
+        with self._lock:
+            return {
+                client_id: dict(session) for client_id, session in self._sessions.items()
+                if session['last_activity'] >= cutoff and (client_ids is None or client_id in client_ids)
+            }
+
+    def clear(self, client_id):
+        with self._lock:
+            return 1 if self._sessions.pop(client_id, None) else 0
+
+    def purge_expired(self):
+        cutoff = datetime.now(timezone.utc) - self.ttl
+        with self._lock:
+            expired = [key for key, session in self._sessions.items() if session['last_activity'] < cutoff]
+            for key in expired:
+                del self._sessions[key]
+            return len(expired)
+
+class SqliteEditingSessionStore(EditingSessionStore):
+    """SQLite file (WAL, one connection per thread) shared by the workers on one host."""
+
+    def __init__(self, ttl, path):
+        super().__init__(ttl)
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS editing_sessions ("
+                "client_id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, "
+                "started_at REAL NOT NULL, last_activity REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_editing_sessions_last_activity ON editing_sessions (last_activity)"
+            )
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        client_id, user_id, started_at, last_activity = row
+        return {
+            'client_id': client_id,
+            'user_id': user_id,
+            'started_at': datetime.fromtimestamp(started_at, timezone.utc),
+            'last_activity': datetime.fromtimestamp(last_activity, timezone.utc),
+        }
+
+    def claim(self, client_id, user_id):
+        now = time.time()
+        conn = self._connection()
+        # Takes the row over only when it is ours or expired; the SELECT reports whoever holds it
+        conn.execute(
+            "INSERT INTO editing_sessions (client_id, user_id, started_at, last_activity) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (client_id) DO UPDATE SET "
+            "started_at = CASE WHEN user_id = excluded.user_id THEN started_at ELSE excluded.started_at END, "
+            "user_id = excluded.user_id, last_activity = excluded.last_activity "
+            "WHERE user_id = excluded.user_id OR last_activity < ?",
+            (client_id, user_id, now, now, now - self.ttl.total_seconds())
+        )
+        row = conn.execute(
+            "SELECT client_id, user_id, started_at, last_activity FROM editing_sessions WHERE client_id = ?",
+            (client_id,)
+        ).fetchone()
+        return self._to_dict(row)
+
+    def touch(self, client_id, user_id):
+        return self._connection().execute(
+            "UPDATE editing_sessions SET last_activity = ? WHERE client_id = ? AND user_id = ?",
+            (time.time(), client_id, user_id)
+        ).rowcount > 0
+
+    def release(self, client_id, user_id):
+        return self._connection().execute(
+            "DELETE FROM editing_sessions WHERE client_id = ? AND user_id = ?", (client_id, user_id)
+        ).rowcount > 0
+
+    def get(self, client_id):
+        row = self._connection().execute(
+            "SELECT client_id, user_id, started_at, last_activity FROM editing_sessions "
+            "WHERE client_id = ? AND last_activity >= ?",
+            (client_id, time.time() - self.ttl.total_seconds())
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def get_many(self, client_ids=None):
+        sql = ("SELECT client_id, user_id, started_at, last_activity FROM editing_sessions "
+               "WHERE last_activity >= ?")
+        params = [time.time() - self.ttl.total_seconds()]
+        if client_ids is not None:
+            client_ids = list(client_ids)
+            sql += f" AND client_id IN ({', '.join('?' * len(client_ids))})"
+            params.extend(client_ids)
+        return {row[0]: self._to_dict(row) for row in self._connection().execute(sql, params)}
+
+    def clear(self, client_id):
+        return self._connection().execute(
+            "DELETE FROM editing_sessions WHERE client_id = ?", (client_id,)
+        ).rowcount
+
+    def purge_expired(self):
+        return self._connection().execute(
+            "DELETE FROM editing_sessions WHERE last_activity < ?", (time.time() - self.ttl.total_seconds(),)
+        ).rowcount
+
+def create_editing_session_store(kind, ttl=None):
+    ttl = ttl or EDITING_SESSION_TTL
+    if kind == 'memory':
+        return MemoryEditingSessionStore(ttl)
+    if kind == 'sqlite':
+        return SqliteEditingSessionStore(ttl, EDITING_SESSION_STORE_PATH)
+    if kind == 'database':
+        return DatabaseEditingSessionStore(ttl)
+    raise ValueError(f"Unknown editing session store: {kind}")
+
+editing_sessions = create_editing_session_store(EDITING_SESSION_STORE)
+
+def reap_editing_sessions():
+    """Delete expired editing sessions from the configured store; returns how many were removed."""
+    removed = editing_sessions.purge_expired()
+    db.session.commit()
+    return removed
+
+def start_editing_session_reaper(interval):
+    """Run reap_editing_sessions() and prune_deleted_clients() every `interval` seconds on a daemon thread.
+
+    Returns an Event that stops the thread when set. Each worker process runs
+    its own reaper; concurrent purges are harmless.
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            with app.app_context():
+                try:
+                    reap_editing_sessions()
+                    prune_deleted_clients()
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error reaping editing sessions: {e}")
+
+    threading.Thread(target=run, name='editing-session-reaper', daemon=True).start()
+    return stop
+
+if EDITING_SESSION_REAPER_INTERVAL > 0:
+    start_editing_session_reaper(EDITING_SESSION_REAPER_INTERVAL)
+
 # --- Editing Session Management API ---
 
 @app.route('/api/clients/<int:client_id>/editing-session', methods=['POST'])
 def start_editing_session(client_id):
     from flask import request
-    from datetime import datetime, timezone
     
     data = request.get_json() or {}
     user_id = data.get('user_id', request.remote_addr)  # Use IP as fallback
@@ -742,35 +2618,20 @@ def start_editing_session(client_id):
         if not client:
             return jsonify({"error": "Client not found"}), 404
         
-        # Clean up expired sessions (older than 10 minutes)
-        expired_time = datetime.now(timezone.utc) - timedelta(minutes=10)
-        EditingSession.query.filter(
-            EditingSession.last_activity < expired_time
-        ).delete()
+        session = editing_sessions.claim(client_id, user_id)
+        if session['user_id'] == user_id and session['started_at'] == session['last_activity']:
+            publish_event('editing_started', client_id, user_id=user_id)
+        db.session.commit()
         
         # Check if there's an active editing session by another user
-        active_session = EditingSession.query.filter_by(client_id=client_id).first()
-        if active_session and active_session.user_id != user_id:
+        if session['user_id'] != user_id:
             return jsonify({
                 "status": "editing_by_other",
                 "message": "Client is currently being edited by another user",
-                "editor": active_session.user_id,
-                "started_at": active_session.started_at.isoformat()
+                "editor": session['user_id'],
+                "started_at": session['started_at'].isoformat()
             }), 200
         
-        # If same user, update last activity
-        if active_session and active_session.user_id == user_id:
-            active_session.last_activity = datetime.now(timezone.utc)
-        else:
-            # Create new editing session
-            new_session = EditingSession(
-                client_id=client_id,
-                user_id=user_id
-            )
-            db.session.add(new_session)
-        
-        db.session.commit()
-        
         return jsonify({
             "status": "editing_allowed",
             "message": "Editing session started successfully",
@@ -785,19 +2646,12 @@ def start_editing_session(client_id):
 @app.route('/api/clients/<int:client_id>/editing-session', methods=['PUT'])
 def update_editing_session(client_id):
     from flask import request
-    from datetime import datetime, timezone
     
     data = request.get_json() or {}
     user_id = data.get('user_id', request.remote_addr)
     
     try:
-        session = EditingSession.query.filter_by(
-            client_id=client_id, 
-            user_id=user_id
-        ).first()
-        
-        if session:
-            session.last_activity = datetime.now(timezone.utc)
+        if editing_sessions.touch(client_id, user_id):
             db.session.commit()
             return jsonify({"message": "Session updated"}), 200
         else:
@@ -816,13 +2670,8 @@ def end_editing_session(client_id):
     user_id = data.get('user_id', request.remote_addr)
     
     try:
-        session = EditingSession.query.filter_by(
-            client_id=client_id,
-            user_id=user_id
-        ).first()
-        
-        if session:
-            db.session.delete(session)
+        if editing_sessions.release(client_id, user_id):
+            publish_event('editing_ended', client_id, user_id=user_id)
             db.session.commit()
             return jsonify({"message": "Editing session ended"}), 200
         else:
@@ -835,25 +2684,16 @@ def end_editing_session(client_id):
 
 @app.route('/api/clients/<int:client_id>/editing-status', methods=['GET'])
 def get_editing_status(client_id):
-    from datetime import datetime, timezone, timedelta
-    
     try:
-        # Clean up expired sessions first
-        expired_time = datetime.now(timezone.utc) - timedelta(minutes=10)
-        EditingSession.query.filter(
-            EditingSession.last_activity < expired_time
-        ).delete()
-        db.session.commit()
-        
-        # Check current editing status
-        active_session = EditingSession.query.filter_by(client_id=client_id).first()
+        # Expired sessions are ignored by the store, so this is a read only
+        session = editing_sessions.get(client_id)
         
-        if active_session:
+        if session:
             return jsonify({
                 "is_editing": True,
-                "editor": active_session.user_id,
-                "started_at": active_session.started_at.isoformat(),
-                "last_activity": active_session.last_activity.isoformat()
+                "editor": session['user_id'],
+                "started_at": session['started_at'].isoformat(),
+                "last_activity": session['last_activity'].isoformat()
             }), 200
         else:
             return jsonify({
@@ -864,12 +2704,49 @@ def get_editing_status(client_id):
         print(f"Error getting editing status: {e}")
         return jsonify({"error": "Could not get editing status"}), 500
 
+EDITING_STATUS_MAX_CLIENTS = 1000
+
+@app.route('/api/editing-status', methods=['GET'])
+def get_editing_statuses():
+    """Editing status of many clients in one read.
+
+    ?client_ids= (comma-separated or repeated) returns an entry for each of
+    those clients; without it, only the clients currently being edited are
+    listed. Entries have the same shape as /api/clients/<id>/editing-status.
+    """
+    from flask import request
+    try:
+        raw_ids = [value for raw in request.args.getlist('client_ids') for value in raw.split(',') if value.strip()]
+        client_ids = {int(value) for value in raw_ids} if raw_ids else None
+    except ValueError:
+        return jsonify({"error": "client_ids must be integers"}), 400
+    if client_ids is not None and len(client_ids) > EDITING_STATUS_MAX_CLIENTS:
+        return jsonify({"error": f"At most {EDITING_STATUS_MAX_CLIENTS} client_ids per request"}), 400
+
+    try:
+        sessions = editing_sessions.get_many(client_ids)
+        statuses = {client_id: {"is_editing": False} for client_id in client_ids or ()}
+        for client_id, session in sessions.items():
+            statuses[client_id] = {
+                "is_editing": True,
+                "editor": session['user_id'],
+                "started_at": session['started_at'].isoformat(),
+                "last_activity": session['last_activity'].isoformat()
+            }
+        return jsonify({str(client_id): status for client_id, status in statuses.items()}), 200
+
+    except Exception as e:
+        print(f"Error getting editing statuses: {e}")
+        return jsonify({"error": "Could not get editing status"}), 500
+
 @app.route('/api/clients/<int:client_id>/editing-session/force-unlock', methods=['DELETE'])
 def force_unlock_editing_session(client_id):
     """Force unlock editing session (管理者用)"""
     try:
         # Delete all editing sessions for this client
-        deleted_count = EditingSession.query.filter_by(client_id=client_id).delete()
+        deleted_count = editing_sessions.clear(client_id)
+        if deleted_count:
+            publish_event('editing_ended', client_id, user_id=None)
         db.session.commit()
         
         return jsonify({
@@ -882,77 +2759,151 @@ def force_unlock_editing_session(client_id):
         print(f"Error force unlocking session: {e}")
         return jsonify({"error": "Could not force unlock session"}), 500
 
+# --- Change Events API ---
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """Server-Sent Events stream of editing presence and client changes.
+
+    ?client_id= (repeatable or comma-separated) limits the stream to those
+    clients plus bulk changes; without it every event is sent. Each event is
+    `event: <type>` with a JSON `data:` line carrying at least type and client_id.
+    A stream ends after EVENT_STREAM_MAX_SECONDS and the browser reconnects; past
+    EVENT_STREAM_LIMIT open streams in this process the answer is 503.
+    """
+    from flask import request, Response
+    try:
+        client_ids = {int(value) for raw in request.args.getlist('client_id') for value in raw.split(',') if value.strip()}
+    except ValueError:
+        return jsonify({"error": "client_id must be an integer"}), 400
+
+    slots = _event_stream_slots
+    if not slots.acquire(blocking=False):
+        response = jsonify({"error": "Too many live update streams. Please try again later."})
+        response.headers['Retry-After'] = str(EVENT_RETRY_MS // 1000)
+        return response, 503
+
+    try:
+        subscription = event_broker.subscribe(client_ids)
+    except Exception:
+        slots.release()
+        raise
+    deadline = time.monotonic() + EVENT_STREAM_MAX_SECONDS
+
+    def generate():
+        yield f"retry: {EVENT_RETRY_MS}\n\n"
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                message = subscription.queue.get(timeout=min(EVENT_KEEPALIVE_SECONDS, remaining))
+            except queue.Empty:
+                # Keeps proxies from timing out and surfaces disconnected clients
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {message['type']}\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+
+    def close():
+        event_broker.unsubscribe(subscription)
+        slots.release()
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: pass events through unbuffered
+    # Runs when the server closes the response, even if the generator never started
+    response.call_on_close(close)
+    return response
+
 # --- Client Deletion APIs ---
 
 @app.route('/api/clients/<int:client_id>/set-inactive', methods=['PUT'])
+@bounded_lock_wait
 def set_client_inactive(client_id):
     """Set client as inactive (関与終了)"""
+    from flask import request
     try:
-        # Use pessimistic locking
-        client = db.session.query(Client).filter_by(id=client_id).with_for_update().first()
+        client = lock_client(client_id)
         
         if not client:
             return jsonify({"error": "Client not found"}), 404
+        check_version(client, request.get_json(silent=True))
             
         client.is_inactive = True
         client.updated_at = datetime.now(timezone.utc)
+        publish_event('client_updated', client_id)
         
         db.session.commit()
         
         return jsonify({
             "message": f"事業者 {client.name} を関与終了に設定しました",
             "client_id": client_id,
-            "is_inactive": True
+            "is_inactive": True,
+            "version": client.version
         }), 200
         
+    except CONFLICT_ERRORS as e:
+        db.session.rollback()
+        return conflict_response(e)
     except Exception as e:
         db.session.rollback()
         print(f"Error setting client inactive: {e}")
         return jsonify({"error": "関与終了の設定に失敗しました"}), 500
 
 @app.route('/api/clients/<int:client_id>/reactivate', methods=['PUT'])
+@bounded_lock_wait
 def reactivate_client(client_id):
     """Reactivate inactive client (関与終了から復活)"""
+    from flask import request
     try:
-        # Use pessimistic locking
-        client = db.session.query(Client).filter_by(id=client_id).with_for_update().first()
+        client = lock_client(client_id)
         
         if not client:
             return jsonify({"error": "Client not found"}), 404
+        check_version(client, request.get_json(silent=True))
             
         client.is_inactive = False
         client.updated_at = datetime.now(timezone.utc)
+        publish_event('client_updated', client_id)
         
         db.session.commit()
         
         return jsonify({
             "message": f"事業者 {client.name} を復活しました",
             "client_id": client_id,
-            "is_inactive": False
+            "is_inactive": False,
+            "version": client.version
         }), 200
         
+    except CONFLICT_ERRORS as e:
+        db.session.rollback()
+        return conflict_response(e)
     except Exception as e:
         db.session.rollback()
         print(f"Error reactivating client: {e}")
         return jsonify({"error": "復活の設定に失敗しました"}), 500
 
 @app.route('/api/clients/<int:client_id>', methods=['DELETE'])
+@bounded_lock_wait
 def delete_client(client_id):
     """Completely delete client and all related data"""
+    from flask import request
     try:
-        # Use pessimistic locking
-        client = db.session.query(Client).filter_by(id=client_id).with_for_update().first()
+        client = lock_client(client_id)
         
         if not client:
             return jsonify({"error": "Client not found"}), 404
+        check_version(client, request.get_json(silent=True))
         
         client_name = client.name
         
         # Delete all related monthly tasks (cascade should handle this, but explicit deletion for safety)
         MonthlyTask.query.filter_by(client_id=client_id).delete()
+        if task_status_table_enabled():
+            TaskStatus.query.filter_by(client_id=client_id).delete()
+        editing_sessions.clear(client_id)
         
-        # Delete the client
+        # Delete the client (its progress summary columns go with the row)
         db.session.delete(client)
+        db.session.add(DeletedClient(client_id=client_id))
+        publish_event('client_deleted', client_id)
         db.session.commit()
         
         return jsonify({
@@ -960,6 +2911,9 @@ def delete_client(client_id):
             "client_id": client_id
         }), 200
         
+    except CONFLICT_ERRORS as e:
+        db.session.rollback()
+        return conflict_response(e)
     except Exception as e:
         db.session.rollback()
         print(f"Error deleting client: {e}")
@@ -1015,6 +2969,8 @@ def export_clients_csv():
         print(f"Error exporting clients: {e}")
         return jsonify({"error": "CSVエクスポートに失敗しました"}), 500
 
+CSV_IMPORT_FIELDS = ('name', 'fiscal_month', 'staff_id', 'accounting_method', 'status', 'is_inactive')
+
 @app.route('/api/clients/import', methods=['POST'])
 def import_clients_csv():
     """Import clients from CSV format"""
@@ -1060,11 +3016,11 @@ def import_clients_csv():
             return jsonify({"error": "CSVファイルが空です"}), 400
         
         # Get existing staff for validation
-        staff_map = {staff.name: staff.id for staff in Staff.query.all()}
+        staffs, _ = cached_reference_data('staffs', load_staffs)
+        staff_map = {staff['name']: staff['id'] for staff in staffs}
         
-        added_count = 0
-        updated_count = 0
         errors = []
+        rows = {}  # client_no -> row; a later line for the same No. wins
         
         for row_num, row in enumerate(csv_reader, start=2):  # Start from row 2 (after header)
             try:
@@ -1097,48 +3053,29 @@ def import_clients_csv():
                     errors.append(f"行{row_num}: 担当者 '{staff_name}' が見つかりません")
                     continue
                 
-                # Check if client exists
-                existing_client = Client.query.filter_by(id=client_no).first()
-                
-                if existing_client:
-                    # Update existing client
-                    existing_client.name = name
-                    existing_client.fiscal_month = int(fiscal_month)
-                    existing_client.staff_id = staff_map[staff_name]
-                    existing_client.accounting_method = accounting_method
-                    existing_client.status = status
-                    existing_client.is_inactive = is_inactive
-                    updated_count += 1
-                else:
-                    # Fetch default tasks based on accounting method for new client
-                    default_tasks = DefaultTask.query.filter_by(accounting_method=accounting_method).first()
-                    
-                    initial_custom_tasks = {}
-                    if default_tasks and default_tasks.tasks:
-                        current_year = str(datetime.now().year)
-                        initial_custom_tasks[current_year] = default_tasks.tasks
-
-                    # Create new client
-                    new_client = Client(
-                        id=client_no,
-                        name=name,
-                        fiscal_month=int(fiscal_month),
-                        staff_id=staff_map[staff_name],
-                        accounting_method=accounting_method,
-                        status=status,
-                        is_inactive=is_inactive,
-                        custom_tasks_by_year=initial_custom_tasks,
-                        finalized_years=[]
-                    )
-                    db.session.add(new_client)
-                    added_count += 1
+                rows[client_no] = {
+                    'id': client_no,
+                    'name': name,
+                    'fiscal_month': int(fiscal_month),
+                    'staff_id': staff_map[staff_name],
+                    'accounting_method': accounting_method,
+                    'status': status,
+                    'is_inactive': is_inactive,
+                    # Only used when the client is new; existing clients keep their tasks
+                    'custom_tasks_by_year': initial_custom_tasks_for(accounting_method),
+                }
                     
             except Exception as e:
                 errors.append(f"行{row_num}: {str(e)}")
                 continue
         
-        # Commit changes if no critical errors
-        if added_count > 0 or updated_count > 0:
+        # One batched upsert for all valid lines instead of a lookup and a write per line
+        written = upsert_clients(list(rows.values()), update_fields=CSV_IMPORT_FIELDS)
+        added_count = sum(1 for client in written if client.version == 1)
+        updated_count = len(written) - added_count
+        if written:
+            refresh_progress_summary([client.id for client in written])
+            publish_event('clients_updated')
             db.session.commit()
         
         result = {
@@ -1155,8 +3092,28 @@ def import_clients_csv():
         print(f"Error importing clients: {e}")
         return jsonify({"error": "CSVインポートに失敗しました"}), 500
 
+# --- Metrics API ---
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Lock-wait counters of this process (each gunicorn worker keeps its own)."""
+    with _lock_wait_stats_lock:
+        lock_waits = dict(lock_wait_stats)
+    return jsonify({
+        "pid": os.getpid(),
+        "write_lock_mode": WRITE_LOCK_MODE,
+        "lock_timeout_ms": WRITE_LOCK_TIMEOUT_MS,
+        "lock_waits": lock_waits
+    })
+
 # --- CLI Commands ---
 
+# Default checklist per accounting method for a fresh database (init-db, reset, seed-bulk)
+INITIAL_DEFAULT_TASKS = {
+    "記帳代行": ["受付", "入力完了", "担当チェック", "不明投げかけ", "月次完了"],
+    "自計": ["データ受領", "担当チェック", "不明投げかけ", "月次完了"]
+}
+
 @app.cli.command("init-db")
 def init_db_command():
     """Creates the database tables and populates them with initial data."""
@@ -1166,12 +3123,10 @@ def init_db_command():
 
         # --- Initial Data ---
         initial_staffs_data = ["佐藤", "鈴木", "高橋", "田中", "渡辺"]
-        staff_map = {}
-        for name in initial_staffs_data:
-            staff = Staff(name=name)
-            db.session.add(staff)
-            db.session.commit()
-            staff_map[name] = staff.id
+        staffs = [Staff(name=name) for name in initial_staffs_data]
+        db.session.add_all(staffs)
+        db.session.flush()  # Assign ids without a commit per row
+        staff_map = {staff.name: staff.id for staff in staffs}
 
         initial_clients_data = [
             { "no": 101, "name": "株式会社アルファ", "fiscal_month": "1月", "担当者": "佐藤", "accounting_method": "記帳代行" , "status": "完了" },
@@ -1185,22 +3140,8 @@ def init_db_command():
         ]
 
         # --- Initial Default Tasks ---
-        default_tasks_data = [
-            {
-                "accounting_method": "記帳代行",
-                "tasks": ["受付", "入力完了", "担当チェック", "不明投げかけ", "月次完了"]
-            },
-            {
-                "accounting_method": "自計",
-                "tasks": ["データ受領", "担当チェック", "不明投げかけ", "月次完了"]
-            }
-        ]
-        for data in default_tasks_data:
-            default_task = DefaultTask(
-                accounting_method=data["accounting_method"],
-                tasks=data["tasks"]
-            )
-            db.session.add(default_task)
+        for accounting_method, tasks in INITIAL_DEFAULT_TASKS.items():
+            db.session.add(DefaultTask(accounting_method=accounting_method, tasks=list(tasks)))
         db.session.commit()
 
         # Fetch the just-created default tasks to use for seeding clients
@@ -1239,11 +3180,201 @@ def init_db_command():
         for key, value in initial_settings.items():
             setting = Setting(key=key, value=value)
             db.session.add(setting)
+        invalidate_reference_cache(*REFERENCE_CACHE_NAMES)
         db.session.commit()
 
         print("Database initialized and seeded with initial data.")
 
 
+@app.cli.command("rebuild-progress")
+def rebuild_progress_command():
+    """Backfills the persisted monthly progress summary for every client."""
+    with app.app_context():
+        updated = refresh_progress_summary()
+        db.session.commit()
+        print(f"Rebuilt monthly progress for {updated} clients.")
+
+@app.cli.command("prune-deleted-clients")
+def prune_deleted_clients_command():
+    """Deletes client deletion tombstones older than DELETED_CLIENT_RETENTION_DAYS."""
+    with app.app_context():
+        removed = prune_deleted_clients()
+        db.session.commit()
+        print(f"Removed {removed} deleted-client tombstones.")
+
+
+@app.cli.command("close-month")
+@click.argument("year_month")
+@click.option("--task", "tasks", multiple=True, help="Task to check; repeatable. Omit to mark the month 月次完了.")
+@click.option("--client-id", "client_ids", type=int, multiple=True, help="Client No.; repeatable. Default: all active clients.")
+@click.option("--staff-id", type=int, help="Only clients of this staff member.")
+def close_month_command(year_month, tasks, client_ids, staff_id):
+    """Closes a month (YYYY-MM) for many clients in one transaction."""
+    if client_ids:
+        selection = {"ids": list(client_ids)}
+    else:
+        selection = {"filter": {"is_inactive": False, "staff_id": staff_id}}
+    with app.app_context():
+        created, updated = close_month(select_clients(selection), parse_year_month_param(year_month), list(tasks))
+        db.session.commit()
+        print(f"Closed {year_month}: {created} month rows created, {updated} updated.")
+
+@app.cli.command("rollout-default-tasks")
+@click.argument("accounting_method")
+@click.argument("years", nargs=-1, required=True)
+@click.option("--dry-run", is_flag=True, help="Only report how many clients would change.")
+def rollout_default_tasks_command(accounting_method, years, dry_run):
+    """Pushes the saved default tasks to existing clients' unfinalized YEARS."""
+    with app.app_context():
+        tasks = load_default_tasks().get(accounting_method)
+        if not tasks:
+            print(f"No default tasks for {accounting_method}.")
+            return
+        per_year, clients = rollout_default_tasks(accounting_method, list(years), tasks, dry_run)
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+        for year, count in per_year.items():
+            print(f"{year}: {count} clients")
+        print(f"{'Would update' if dry_run else 'Updated'} {clients} clients.")
+
+@app.cli.command("reap-editing-sessions")
+def reap_editing_sessions_command():
+    """Deletes expired editing sessions (run from cron when the background reaper is off)."""
+    with app.app_context():
+        removed = reap_editing_sessions()
+        print(f"Removed {removed} expired editing sessions.")
+
+@app.cli.command("retire-task")
+@click.argument("task_names", nargs=-1, required=True)
+@click.option("--accounting-method", help="Only clients with this accounting method.")
+def retire_task_command(task_names, accounting_method):
+    """Removes TASK_NAMES from every client's monthly history."""
+    with app.app_context():
+        criteria = []
+        if accounting_method:
+            criteria.append(MonthlyTask.client_id.in_(
+                db.select(Client.id).where(Client.accounting_method == accounting_method)
+            ))
+        updated = remove_task_keys(list(task_names), *criteria)
+        db.session.commit()
+        print(f"Removed {', '.join(task_names)} from {len(updated)} months.")
+
+@app.cli.command("sync-task-statuses")
+def sync_task_statuses_command():
+    """Rebuilds task_statuses from the JSON task maps (run before enabling 'table' mode)."""
+    with app.app_context():
+        written = sync_task_statuses()
+        db.session.commit()
+        print(f"Wrote {written} task status rows.")
+
+
+SEED_INSERT_BATCH_SIZE = 5000
+
+def seed_bulk_data(clients, staffs, years, fill_ratio, seed=None):
+    """Generate synthetic staffs, clients and monthly tasks with bulk INSERTs.
+
+    New client numbers continue after the current maximum so existing data is
+    kept; staff ids come from the database so its sequence stays in step.
+    Returns (staff_ids, client_ids, monthly_task_count); the caller commits.
+    """
+    import random
+    rng = random.Random(seed)
+
+    default_tasks = load_default_tasks() or INITIAL_DEFAULT_TASKS
+    methods = sorted(default_tasks)
+    today = datetime.now()
+    current_key = today.year * 100 + today.month
+
+    first_staff = (db.session.query(db.func.max(Staff.id)).scalar() or 0) + 1
+    staff_ids = db.session.scalars(
+        db.insert(Staff).returning(Staff.id, sort_by_parameter_order=True),
+        [{"name": f"担当者{first_staff + offset}"} for offset in range(staffs)]
+    ).all()
+
+    first_client = (db.session.query(db.func.max(Client.id)).scalar() or 0) + 1
+    client_ids = list(range(first_client, first_client + clients))
+    client_rows = []
+    task_count = 0
+    task_rows = []
+
+    def flush_tasks():
+        if task_rows:
+            db.session.execute(db.insert(MonthlyTask), task_rows)
+            task_rows.clear()
+
+    for client_id in client_ids:
+        method = rng.choice(methods)
+        task_names = default_tasks[method]
+        client_rows.append({
+            "id": client_id,
+            "name": f"サンプル事業者{client_id}",
+            "fiscal_month": rng.randint(1, 12),
+            "staff_id": rng.choice(staff_ids),
+            "accounting_method": method,
+            "status": rng.choice(VALID_CLIENT_STATUSES),
+            "is_inactive": rng.random() < 0.05,
+            "custom_tasks_by_year": {str(today.year - y): list(task_names) for y in range(years)},
+            "finalized_years": [str(today.year - y) for y in range(2, years)],
+        })
+
+        # Each client has a backlog of 0-3 recent months; everything older is usually done
+        backlog = rng.choice([0, 0, 1, 1, 2, 3])
+        for offset in range(years * 12):
+            if rng.random() >= fill_ratio:
+                continue
+            year_month = shift_year_month(current_key, -offset)
+            if offset < backlog:
+                tasks = {name: {"checked": rng.random() < 0.4, "note": ""} for name in task_names}
+            else:
+                tasks = {name: {"checked": rng.random() < 0.98, "note": ""} for name in task_names}
+            done = sum(task["checked"] for task in tasks.values())
+            task_rows.append({
+                "client_id": client_id,
+                "month": format_year_month(year_month),
+                "year_month": year_month,
+                "tasks": tasks,
+                "status": "月次完了" if done == len(tasks) else ("未入力" if done == 0 else "作業中"),
+                "url": "",
+                "memo": ""
+            })
+            task_count += 1
+        if len(client_rows) >= SEED_INSERT_BATCH_SIZE:
+            db.session.execute(db.insert(Client), client_rows)
+            client_rows.clear()
+        if len(task_rows) >= SEED_INSERT_BATCH_SIZE:
+            if client_rows:
+                db.session.execute(db.insert(Client), client_rows)
+                client_rows.clear()
+            flush_tasks()
+
+    if client_rows:
+        db.session.execute(db.insert(Client), client_rows)
+    flush_tasks()
+    refresh_progress_summary(client_ids)
+    if task_status_table_enabled():
+        sync_task_statuses(MonthlyTask.client_id.in_(client_ids))
+    return staff_ids, client_ids, task_count
+
+@app.cli.command("seed-bulk")
+@click.option('--clients', default=1000, show_default=True, help='Number of clients to generate.')
+@click.option('--staffs', default=10, show_default=True, help='Number of staff members to generate.')
+@click.option('--years', default=3, show_default=True, help='Years of monthly task history per client.')
+@click.option('--fill-ratio', default=0.9, show_default=True, help='Share of months that have a task row.')
+@click.option('--seed', default=None, type=int, help='Random seed for reproducible data.')
+def seed_bulk_command(clients, staffs, years, fill_ratio, seed):
+    """Bulk-inserts synthetic clients and monthly tasks for load testing."""
+    if staffs < 1:
+        raise click.BadParameter('at least one staff member is required', param_hint='--staffs')
+    with app.app_context():
+        started = time.perf_counter()
+        staff_ids, client_ids, task_count = seed_bulk_data(clients, staffs, years, fill_ratio, seed)
+        db.session.commit()
+        print(f"Seeded {len(staff_ids)} staffs, {len(client_ids)} clients and "
+              f"{task_count} monthly tasks in {time.perf_counter() - started:.1f}s.")
+
+
 # Auto-initialize database on startup (for production)
 def ensure_database_initialized():
     """Ensure database is initialized when app starts"""
@@ -1349,22 +3480,8 @@ def reset_database():
         print("✅ Initial staff added")
         
         # Add default tasks
-        default_tasks_data = [
-            {
-                "accounting_method": "記帳代行",
-                "tasks": ["受付", "入力完了", "担当チェック", "不明投げかけ", "月次完了"]
-            },
-            {
-                "accounting_method": "自計", 
-                "tasks": ["データ受領", "担当チェック", "不明投げかけ", "月次完了"]
-            }
-        ]
-        for data in default_tasks_data:
-            default_task = DefaultTask(
-                accounting_method=data["accounting_method"],
-                tasks=data["tasks"]
-            )
-            db.session.add(default_task)
+        for accounting_method, tasks in INITIAL_DEFAULT_TASKS.items():
+            db.session.add(DefaultTask(accounting_method=accounting_method, tasks=list(tasks)))
         db.session.commit()
         print("✅ Default tasks added")
         
@@ -1382,6 +3499,7 @@ def reset_database():
         for key, value in initial_settings.items():
             setting = Setting(key=key, value=value)
             db.session.add(setting)
+        invalidate_reference_cache(*REFERENCE_CACHE_NAMES)
         db.session.commit()
         
         return jsonify({
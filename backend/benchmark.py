@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmark: seeds a large dataset and measures every route in app.py
+
+Usage:
+    python benchmark.py --clients 10000 --years 5 --output baseline.json
+    python benchmark.py --clients 10000 --years 5 --compare baseline.json
+
+For each route it records p50/p95/p99 latency, queries per request and peak
+Python memory for one request. With --compare the run exits non-zero when a
+route's p95 latency or query count regresses beyond the baseline.
+Uses a throwaway SQLite file unless --database-url is given; never point it
+at a database whose data you want to keep.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Routes that cannot be repeated against the seeded dataset
+SKIPPED_ENDPOINTS = {
+    'static': 'not an API route',
+    'reset_database': 'drops every table',
+    'stream_events': 'long-lived event stream',
+}
+
+def percentile(values, pct):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def seed_dataset(app, db, clients, staffs, years, fill_ratio, seed):
+    """Create the schema and bulk-seed it (see `flask seed-bulk`); returns the seeded client ids."""
+    from app import DefaultTask, INITIAL_DEFAULT_TASKS, seed_bulk_data
+
+    with app.app_context():
+        db.create_all()
+        for method, tasks in INITIAL_DEFAULT_TASKS.items():
+            if not DefaultTask.query.filter_by(accounting_method=method).first():
+                db.session.add(DefaultTask(accounting_method=method, tasks=tasks))
+        db.session.flush()
+        _, client_ids, _ = seed_bulk_data(clients, staffs, years, fill_ratio, seed)
+        db.session.commit()
+        return client_ids
+
+
+class RouteBench:
+    """Builds requests for each endpoint against the seeded data."""
+
+    def __init__(self, app, db, client_ids):
+        self.app = app
+        self.db = db
+        self.http = app.test_client()
+        self.client_ids = client_ids
+        self.rng = random.Random(1)
+        self.next_id = max(client_ids) + 1_000_000
+        self._staff_id = None
+
+    @property
+    def staff_id(self):
+        if self._staff_id is None:
+            self._staff_id = self.http.get('/api/staffs').get_json()[0]['id']
+        return self._staff_id
+
+    def any_client(self):
+        return self.rng.choice(self.client_ids)
+
+    def fresh_client(self):
+        """Create an untimed throwaway client for destructive routes."""
+        self.next_id += 1
+        self.http.post('/api/clients', json={
+            "id": self.next_id, "name": "ベンチ一時", "fiscal_month": 3,
+            "staff_id": self.staff_id, "accounting_method": "記帳代行"
+        })
+        return self.next_id
+
+    def fresh_staff(self):
+        self.next_id += 1
+        rv = self.http.post('/api/staffs', json={"name": f"ベンチ一時担当{self.next_id}"})
+        return rv.get_json()['id']
+
+    def specs(self):
+        """endpoint name -> callable returning (method, url, request kwargs); setup inside is untimed."""
+        from app import INITIAL_DEFAULT_TASKS as DEFAULT_TASKS
+        year = str(datetime.now().year)
+        csv_body = "No.,事業所名,決算月,担当者,経理方式,進捗ステータス,状態\n"
+
+        def details_payload():
+            client_id = self.any_client()
+            details = self.http.get(f'/api/clients/{client_id}').get_json()
+            return 'PUT', f'/api/clients/{client_id}', {"json": details}
+
+        def import_payload():
+            staff = self.http.get('/api/staffs').get_json()[0]['name']
+            body = csv_body + f"{self.any_client()},ベンチ取込,3月,{staff},記帳代行,作業中,有効\n"
+            return 'POST', '/api/clients/import', {
+                "data": {"file": (io.BytesIO(body.encode('utf-8')), 'clients.csv')},
+                "content_type": 'multipart/form-data'
+            }
+
+        def session_payload(method, path):
+            def build():
+                client_id = self.any_client()
+                self.http.post(f'/api/clients/{client_id}/editing-session', json={"user_id": "bench"})
+                return method, f'/api/clients/{client_id}/{path}', {"json": {"user_id": "bench"}}
+            return build
+
+        return {
+            'get_clients': lambda: ('GET', '/api/clients', {}),
+            'get_client_changes': lambda: ('GET', '/api/clients/changes', {
+                "query_string": {"since": datetime.now().isoformat()}}),
+            'create_client': lambda: ('POST', '/api/clients', {"json": {
+                "id": self.fresh_id(), "name": "ベンチ新規", "fiscal_month": 3,
+                "staff_id": self.staff_id, "accounting_method": "記帳代行"}}),
+            'bulk_update_clients': lambda: ('POST', '/api/clients/bulk', {"json": {
+                "filter": {"staff_id": self.staff_id}, "patch": {"status": "作業中"}}}),
+            'month_close': lambda: ('POST', '/api/clients/month-close', {"json": {
+                "year_month": f"{year}-01", "filter": {"staff_id": self.staff_id}, "tasks": ["担当チェック"]}}),
+            'get_clients_by_task': lambda: ('GET', '/api/clients/by-task', {
+                "query_string": {"task": "担当チェック", "year_month": f"{year}-01"}}),
+            'get_client_details': lambda: ('GET', f'/api/clients/{self.any_client()}', {}),
+            'update_client_details': details_payload,
+            'patch_monthly_task': lambda: ('PATCH', f'/api/clients/{self.any_client()}/monthly-tasks/{year}-01', {
+                "json": {"tasks": {"担当チェック": True}, "memo": "ベンチ"}}),
+            'get_staffs': lambda: ('GET', '/api/staffs', {}),
+            'create_staff': lambda: ('POST', '/api/staffs', {"json": {"name": f"ベンチ新規担当{self.fresh_id()}"}}),
+            'delete_staff': lambda: ('DELETE', f'/api/staffs/{self.fresh_staff()}', {}),
+            'update_staff': lambda: ('PUT', f'/api/staffs/{self.fresh_staff()}', {
+                "json": {"name": f"ベンチ改名{self.fresh_id()}"}}),
+            'get_default_tasks': lambda: ('GET', '/api/default-tasks', {}),
+            'update_default_tasks': lambda: ('PUT', '/api/default-tasks', {"json": DEFAULT_TASKS}),
+            'rollout_default_tasks_endpoint': lambda: ('POST', '/api/default-tasks/rollout', {"json": {
+                "accounting_method": "記帳代行", "years": [str(int(year) + 1)], "dry_run": True}}),
+            'get_settings': lambda: ('GET', '/api/settings', {}),
+            'update_settings': lambda: ('PUT', '/api/settings', {"json": {"benchmark_probe": time.time()}}),
+            'hello_world': lambda: ('GET', '/', {}),
+            'update_custom_tasks_for_year': lambda: ('PUT', f'/api/clients/{self.any_client()}/custom-tasks/{year}', {
+                "json": {"custom_tasks": DEFAULT_TASKS["記帳代行"]}}),
+            'sync_check_custom_tasks': lambda: ('POST', f'/api/clients/{self.any_client()}/custom-tasks/sync-check', {
+                "json": {"custom_tasks_by_year": {year: DEFAULT_TASKS["記帳代行"]}}}),
+            'cleanup_deleted_tasks': lambda: ('POST', f'/api/clients/{self.any_client()}/cleanup-deleted-tasks', {
+                "json": {"year": year, "deleted_tasks": ["存在しないタスク"]}}),
+            'retire_tasks': lambda: ('POST', '/api/tasks/retire', {"json": {"tasks": ["存在しないタスク"]}}),
+            'propagate_tasks_to_future_years': lambda: ('POST', f'/api/clients/{self.any_client()}/propagate-tasks', {
+                "json": {"source_year": year, "target_years": [str(int(year) + 1)]}}),
+            'start_editing_session': lambda: ('POST', f'/api/clients/{self.any_client()}/editing-session', {
+                "json": {"user_id": "bench"}}),
+            'update_editing_session': session_payload('PUT', 'editing-session'),
+            'end_editing_session': session_payload('DELETE', 'editing-session'),
+            'get_editing_status': lambda: ('GET', f'/api/clients/{self.any_client()}/editing-status', {}),
+            'get_editing_statuses': lambda: ('GET', '/api/editing-status', {
+                "query_string": {"client_ids": ",".join(str(self.any_client()) for _ in range(50))}}),
+            'force_unlock_editing_session': session_payload('DELETE', 'editing-session/force-unlock'),
+            'set_client_inactive': lambda: ('PUT', f'/api/clients/{self.fresh_client()}/set-inactive', {}),
+            'reactivate_client': lambda: ('PUT', f'/api/clients/{self.fresh_client()}/reactivate', {}),
+            'delete_client': lambda: ('DELETE', f'/api/clients/{self.fresh_client()}', {}),
+            'export_clients_csv': lambda: ('GET', '/api/clients/export', {}),
+            'get_metrics': lambda: ('GET', '/api/metrics', {}),
+            'import_clients_csv': import_payload,
+        }
+
+    def fresh_id(self):
+        self.next_id += 1
+        return self.next_id
+
+
+def uncovered_endpoints(app, specs):
+    """Endpoints registered on the app that have neither a spec nor a skip reason."""
+    return sorted(
+        rule.endpoint for rule in app.url_map.iter_rules()
+        if rule.endpoint not in specs and rule.endpoint not in SKIPPED_ENDPOINTS
+    )
+
+
+def run_benchmark(app, db, client_ids, iterations):
+    from sqlalchemy import event
+
+    bench = RouteBench(app, db, client_ids)
+    specs = bench.specs()
+    with app.app_context():
+        engine = db.engine
+
+    query_count = [0]
+
+    def count_query(*args):
+        query_count[0] += 1
+
+    results = {}
+    event.listen(engine, 'before_cursor_execute', count_query)
+    try:
+        for endpoint, build in specs.items():
+            latencies, queries, statuses = [], [], set()
+            for _ in range(iterations):
+                method, url, kwargs = build()
+                query_count[0] = 0
+                started = time.perf_counter()
+                response = bench.http.open(url, method=method, **kwargs)
+                response.get_data()
+                latencies.append((time.perf_counter() - started) * 1000)
+                queries.append(query_count[0])
+                statuses.add(response.status_code)
+
+            # Measure memory separately; tracemalloc would distort the timings
+            method, url, kwargs = build()
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            bench.http.open(url, method=method, **kwargs).get_data()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results[f"{method} {endpoint}"] = {
+                "p50_ms": round(percentile(latencies, 50), 3),
+                "p95_ms": round(percentile(latencies, 95), 3),
+                "p99_ms": round(percentile(latencies, 99), 3),
+                "mean_ms": round(statistics.mean(latencies), 3),
+                "queries": max(queries),
+                "peak_memory_kb": round(peak / 1024, 1),
+                "status_codes": sorted(statuses),
+            }
+            print(f"  {method:6} {endpoint:32} p50={results[f'{method} {endpoint}']['p50_ms']:8.2f}ms "
+                  f"p95={results[f'{method} {endpoint}']['p95_ms']:8.2f}ms queries={max(queries)}")
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_query)
+
+    return results, uncovered_endpoints(app, specs)
+
+
+def compare_with_baseline(results, baseline, tolerance, min_delta_ms):
+    """Return human readable regressions of `results` against a previous run."""
+    regressions = []
+    for route, previous in baseline.get("routes", {}).items():
+        current = results.get(route)
+        if current is None:
+            continue
+        slower = current["p95_ms"] - previous["p95_ms"]
+        if slower > min_delta_ms and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["queries"] > previous["queries"]:
+            regressions.append(f"{route}: queries {previous['queries']} -> {current['queries']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--staffs', type=int, default=20)
+    parser.add_argument('--years', type=int, default=2)
+    parser.add_argument('--fill-ratio', type=float, default=0.9)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help="defaults to a temporary SQLite file")
+    parser.add_argument('--output', help="write results as a JSON baseline")
+    parser.add_argument('--compare', help="baseline JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed p95 slowdown (0.25 = 25%%)")
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help="ignore p95 slowdowns smaller than this, to absorb timer noise on fast routes")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        db_file = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+        os.environ['DATABASE_URL'] = f"sqlite:///{db_file}"
+    os.environ.pop('FLASK_ENV', None)
+
+    from app import app, db
+
+    print(f"🔄 Seeding {args.clients} clients × {args.years} years...")
+    started = time.perf_counter()
+    client_ids = seed_dataset(app, db, args.clients, args.staffs, args.years, args.fill_ratio, args.seed)
+    print(f"✅ Seeded in {time.perf_counter() - started:.1f}s")
+
+    print(f"📋 Running {args.iterations} iterations per route...")
+    results, uncovered = run_benchmark(app, db, client_ids, args.iterations)
+    for endpoint in uncovered:
+        print(f"⚠️  No benchmark spec for endpoint '{endpoint}'")
+
+    with app.app_context():
+        dialect = db.engine.dialect.name
+    report = {
+        "meta": {
+            "clients": args.clients, "staffs": args.staffs, "years": args.years,
+            "fill_ratio": args.fill_ratio, "iterations": args.iterations,
+            "database": dialect,
+            "created_at": datetime.now().isoformat(),
+        },
+        "routes": results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f"❌ {regression}")
+        if regressions:
+            return 1
+        print("✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Add typed year_month column to monthly_tasks
+
+Revision ID: 22e07e3ee654
+Revises: d915453efb9f
+Create Date: 2026-10-18 10:03:17.804412
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '22e07e3ee654'
+down_revision = 'd915453efb9f'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 5000
+
+YEAR_MONTH_SQL = (
+    "CAST(SUBSTR(month, 1, 4) AS INTEGER) * 100 + "
+    "CAST(REPLACE(SUBSTR(month, 6), '月', '') AS INTEGER)"
+)
+
+
+def load_json(value):
+    return json.loads(value) if isinstance(value, str) else (value or {})
+
+
+def merge_month_rows(rows):
+    """Combine duplicate rows of one month: a task is checked if any copy checked it,
+    and notes, memos and urls from every copy are kept."""
+    def joined(values, separator):
+        distinct = []
+        for value in values:
+            if value and value not in distinct:
+                distinct.append(value)
+        return separator.join(distinct)
+
+    tasks = {}
+    for row in rows:
+        for name, state in load_json(row.tasks).items():
+            if not isinstance(state, dict):
+                state = {'checked': bool(state), 'note': ''}
+            merged = tasks.setdefault(name, {'checked': False, 'notes': []})
+            merged['checked'] = merged['checked'] or bool(state.get('checked'))
+            merged['notes'].append(state.get('note') or '')
+    return {
+        'tasks': {name: {'checked': state['checked'], 'note': joined(state['notes'], ' / ')}
+                  for name, state in tasks.items()},
+        'status': next((row.status for row in rows if row.status), None),
+        'memo': joined((row.memo for row in rows), '\n'),
+        'url': joined((row.url for row in rows), ' '),
+    }
+
+
+def upgrade():
+    op.add_column('monthly_tasks', sa.Column('year_month', sa.Integer(), nullable=True))
+
+    # Backfill in id-range batches so large tables are not rewritten in one statement
+    connection = op.get_bind()
+    min_id, max_id = connection.execute(sa.text("SELECT MIN(id), MAX(id) FROM monthly_tasks")).fetchone()
+    if min_id is not None:
+        for batch_start in range(min_id, max_id + 1, BATCH_SIZE):
+            connection.execute(
+                sa.text(f"""
+                    UPDATE monthly_tasks SET year_month = {YEAR_MONTH_SQL}
+                    WHERE id >= :batch_start AND id < :batch_end AND month LIKE '____年%月'
+                """),
+                {"batch_start": batch_start, "batch_end": batch_start + BATCH_SIZE}
+            )
+
+    # Duplicate months could be created by racing autosaves. Fold each group into its
+    # first (lowest id) row, which the frontend always edited, so no checkbox, note,
+    # memo or url is lost, then drop the rest.
+    rows = connection.execute(sa.text("""
+        SELECT id, client_id, year_month, tasks, status, memo, url FROM monthly_tasks
+        WHERE year_month IS NOT NULL AND (client_id, year_month) IN (
+            SELECT client_id, year_month FROM monthly_tasks
+            WHERE year_month IS NOT NULL
+            GROUP BY client_id, year_month HAVING COUNT(*) > 1
+        )
+        ORDER BY client_id, year_month, id
+    """)).fetchall()
+    groups = {}
+    for row in rows:
+        groups.setdefault((row.client_id, row.year_month), []).append(row)
+
+    update = sa.text(
+        "UPDATE monthly_tasks SET tasks = :tasks, status = :status, memo = :memo, url = :url WHERE id = :id"
+    ).bindparams(sa.bindparam('tasks', type_=sa.JSON()))
+    for (client_id, year_month), group in groups.items():
+        kept, duplicates = group[0], group[1:]
+        connection.execute(update, {'id': kept.id, **merge_month_rows(group)})
+        connection.execute(
+            sa.text("DELETE FROM monthly_tasks WHERE id IN :ids").bindparams(sa.bindparam('ids', expanding=True)),
+            {'ids': [row.id for row in duplicates]}
+        )
+        print(f"Merged monthly task rows {', '.join(str(row.id) for row in duplicates)} "
+              f"into {kept.id} (client {client_id}, {year_month})")
+
+    op.create_index('uq_monthly_tasks_client_id_year_month', 'monthly_tasks', ['client_id', 'year_month'], unique=True)
+    op.create_index('ix_monthly_tasks_year_month', 'monthly_tasks', ['year_month'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_monthly_tasks_year_month', table_name='monthly_tasks')
+    op.drop_index('uq_monthly_tasks_client_id_year_month', table_name='monthly_tasks')
+    op.drop_column('monthly_tasks', 'year_month')
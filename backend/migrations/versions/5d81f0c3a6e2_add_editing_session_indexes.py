@@ -0,0 +1,40 @@
+"""Add unique client_id and last_activity indexes to editing_sessions
+
+Revision ID: 5d81f0c3a6e2
+Revises: 9e3c5b1f27d4
+Create Date: 2026-10-18 17:58:04.236719
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d81f0c3a6e2'
+down_revision = '9e3c5b1f27d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Racing session starts could leave several rows per client; the most
+    # recently active one is the session the old code reported, so keep it.
+    result = op.get_bind().execute(sa.text("""
+        DELETE FROM editing_sessions
+        WHERE EXISTS (
+            SELECT 1 FROM editing_sessions AS newer
+            WHERE newer.client_id = editing_sessions.client_id
+              AND (newer.last_activity > editing_sessions.last_activity
+                   OR (newer.last_activity = editing_sessions.last_activity AND newer.id > editing_sessions.id))
+        )
+    """))
+    if result.rowcount:
+        print(f"Removed {result.rowcount} duplicate editing sessions")
+
+    op.create_index('uq_editing_sessions_client_id', 'editing_sessions', ['client_id'], unique=True)
+    op.create_index('ix_editing_sessions_last_activity', 'editing_sessions', ['last_activity'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_editing_sessions_last_activity', table_name='editing_sessions')
+    op.drop_index('uq_editing_sessions_client_id', table_name='editing_sessions')
@@ -0,0 +1,51 @@
+"""Convert task JSON columns to JSONB and add GIN indexes
+
+Revision ID: cff41ccc9fe4
+Revises: 4b4ad0c713d8
+Create Date: 2026-10-18 16:05:39.281746
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'cff41ccc9fe4'
+down_revision = '4b4ad0c713d8'
+branch_labels = None
+depends_on = None
+
+
+JSONB_COLUMNS = [
+    ('clients', 'custom_tasks_by_year'),
+    ('clients', 'finalized_years'),
+    ('monthly_tasks', 'tasks'),
+]
+
+GIN_INDEXES = [
+    ('ix_clients_custom_tasks_by_year', 'clients', 'custom_tasks_by_year'),
+    ('ix_clients_finalized_years', 'clients', 'finalized_years'),
+    ('ix_monthly_tasks_tasks', 'monthly_tasks', 'tasks'),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # Rewrites each table once; run during a maintenance window on large databases
+    for table, column in JSONB_COLUMNS:
+        op.alter_column(table, column, type_=postgresql.JSONB(), existing_type=sa.JSON(),
+                        postgresql_using=f'{column}::jsonb')
+    for name, table, column in GIN_INDEXES:
+        op.create_index(name, table, [column], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for name, table, column in GIN_INDEXES:
+        op.drop_index(name, table_name=table)
+    for table, column in JSONB_COLUMNS:
+        op.alter_column(table, column, type_=sa.JSON(), existing_type=postgresql.JSONB(),
+                        postgresql_using=f'{column}::json')
@@ -0,0 +1,58 @@
+"""Add persisted monthly progress summary to clients
+
+Revision ID: d915453efb9f
+Revises: 145dd6f4cdc6
+Create Date: 2026-10-18 09:12:41.527310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd915453efb9f'
+down_revision = '145dd6f4cdc6'
+branch_labels = None
+depends_on = None
+
+
+MONTH_KEY_SQL = (
+    "CAST(SUBSTR(month, 1, 4) AS INTEGER) * 100 + "
+    "CAST(REPLACE(SUBSTR(month, 6), '月', '') AS INTEGER)"
+)
+# Only labels shaped like 'YYYY年M月' are cast; anything else would abort the backfill
+MONTH_LABEL_GUARD = "month LIKE '____年%月'"
+
+
+def upgrade():
+    op.add_column('clients', sa.Column('latest_completed_month', sa.String(length=255), nullable=True))
+    op.add_column('clients', sa.Column('latest_completed_month_key', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_clients_latest_completed_month_key'), 'clients', ['latest_completed_month_key'], unique=False)
+
+    # Backfill from existing monthly tasks (same logic as `flask rebuild-progress`)
+    skipped = op.get_bind().execute(sa.text(
+        f"SELECT COUNT(*) FROM monthly_tasks WHERE status = '月次完了' AND NOT ({MONTH_LABEL_GUARD})"
+    )).scalar()
+    if skipped:
+        print(f"Skipping {skipped} completed months with unparseable labels; fix them and run `flask rebuild-progress`")
+    op.execute(sa.text(f"""
+        UPDATE clients SET
+            latest_completed_month = (
+                SELECT month FROM monthly_tasks
+                WHERE monthly_tasks.client_id = clients.id AND monthly_tasks.status = '月次完了'
+                  AND {MONTH_LABEL_GUARD}
+                ORDER BY {MONTH_KEY_SQL} DESC, monthly_tasks.id DESC
+                LIMIT 1
+            ),
+            latest_completed_month_key = (
+                SELECT MAX({MONTH_KEY_SQL}) FROM monthly_tasks
+                WHERE monthly_tasks.client_id = clients.id AND monthly_tasks.status = '月次完了'
+                  AND {MONTH_LABEL_GUARD}
+            )
+    """))
+
+
+def downgrade():
+    op.drop_index(op.f('ix_clients_latest_completed_month_key'), table_name='clients')
+    op.drop_column('clients', 'latest_completed_month_key')
+    op.drop_column('clients', 'latest_completed_month')
@@ -126,4 +126,951 @@ def test_api_error_handling(client):
     rv = client.post('/api/clients', 
                      data=json.dumps(invalid_data),
                      content_type='application/json')
-    assert rv.status_code >= 400  # Should be an error status
\ No newline at end of file
+    assert rv.status_code >= 400  # Should be an error status
+
+
+def _create_staff_and_client(client, client_id, accounting_method="記帳代行"):
+    """Helper: create a fresh staff member and a client assigned to them"""
+    import random
+    staff_name = f"テストスタッフ{random.randint(100000, 999999)}"
+    rv = client.post('/api/staffs',
+                     data=json.dumps({"name": staff_name}),
+                     content_type='application/json')
+    staff_id = json.loads(rv.data)['id']
+    client.post('/api/clients',
+                data=json.dumps({
+                    "id": client_id,
+                    "name": "テストクライアント",
+                    "fiscal_month": 3,
+                    "staff_id": staff_id,
+                    "accounting_method": accounting_method
+                }),
+                content_type='application/json')
+    return staff_id
+
+def test_get_clients_monthly_progress(client):
+    """Test latest completed month and unattended months on the client list"""
+    import random
+    from app import MonthlyTask
+    client_id = random.randint(10000, 19999)
+    _create_staff_and_client(client, client_id)
+
+    with app.app_context():
+        db.session.add_all([
+            MonthlyTask(client_id=client_id, month="2024年9月", tasks={}, status="月次完了"),
+            MonthlyTask(client_id=client_id, month="2024年12月", tasks={}, status="月次完了"),
+            MonthlyTask(client_id=client_id, month="2025年1月", tasks={}, status="作業中"),
+        ])
+        db.session.commit()
+
+    # Rows inserted behind the API's back only show up after a rebuild
+    result = app.test_cli_runner().invoke(args=['rebuild-progress'])
+    assert "Rebuilt monthly progress" in result.output
+
+    rv = client.get('/api/clients')
+    data = json.loads(rv.data)
+    row = next(c for c in data if c['id'] == client_id)
+    assert row['monthlyProgress'] == "2024年12月"
+    assert row['unattendedMonths'].endswith("ヶ月")
+    assert row['staff_name'].startswith("テストスタッフ")
+
+def test_get_clients_query_count_is_constant(client):
+    """Test the client list does not issue one query per client"""
+    import random
+    from sqlalchemy import event
+
+    def count_queries():
+        statements = []
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            client.get('/api/clients')
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        return len(statements)
+
+    _create_staff_and_client(client, random.randint(20000, 29999))
+    baseline = count_queries()
+    for _ in range(3):
+        _create_staff_and_client(client, random.randint(30000, 39999))
+    assert count_queries() == baseline
+
+def test_progress_summary_maintained_on_update(client):
+    """Test saving monthly tasks keeps the persisted progress summary current"""
+    import random
+    client_id = random.randint(40000, 49999)
+    _create_staff_and_client(client, client_id)
+
+    rv = client.put(f'/api/clients/{client_id}',
+                    data=json.dumps({"monthly_tasks": [
+                        {"month": "2025年2月", "tasks": {"受付": {"checked": True, "note": ""}}}
+                    ]}),
+                    content_type='application/json')
+    tasks = json.loads(rv.data)['monthly_tasks']
+    tasks[0]['status'] = "月次完了"
+    client.put(f'/api/clients/{client_id}',
+               data=json.dumps({"monthly_tasks": tasks}),
+               content_type='application/json')
+
+    data = json.loads(client.get('/api/clients').data)
+    row = next(c for c in data if c['id'] == client_id)
+    assert row['monthlyProgress'] == "2025年2月"
+
+def test_monthly_tasks_keyed_by_year_month(client):
+    """Test months are ordered chronologically and not duplicated by id-less saves"""
+    import random
+    client_id = random.randint(50000, 59999)
+    _create_staff_and_client(client, client_id)
+
+    payload = {"monthly_tasks": [
+        {"month": "2025年10月", "memo": "a"},
+        {"month": "2025年9月", "memo": "b"},
+    ]}
+    for _ in range(2):
+        client.put(f'/api/clients/{client_id}',
+                   data=json.dumps(payload),
+                   content_type='application/json')
+
+    data = json.loads(client.get(f'/api/clients/{client_id}').data)
+    assert [t['month'] for t in data['monthly_tasks']] == ["2025年9月", "2025年10月"]
+
+    rv = client.put(f'/api/clients/{client_id}',
+                    data=json.dumps({"monthly_tasks": [{"month": "2025年9月", "memo": "y"},
+                                                       {"month": "2025-13", "memo": "y"}]}),
+                    content_type='application/json')
+    assert rv.status_code == 400
+    assert "2025-13" in json.loads(rv.data)['error']
+    assert json.loads(client.get(f'/api/clients/{client_id}').data)['monthly_tasks'][0]['memo'] == "b"
+
+def test_update_client_details_batches_monthly_tasks(client):
+    """Test saving a year of months does not issue one query per month"""
+    import random
+    from sqlalchemy import event
+
+    def save(client_id, months):
+        statements = []
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            rv = client.put(f'/api/clients/{client_id}',
+                            data=json.dumps({"monthly_tasks": [
+                                {"month": f"2025年{m}月", "memo": "x", "status": "作業中"} for m in months
+                            ]}),
+                            content_type='application/json')
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        return json.loads(rv.data), len(statements)
+
+    small_id, large_id = random.sample(range(60000, 69999), 2)
+    _create_staff_and_client(client, small_id)
+    _create_staff_and_client(client, large_id)
+
+    _, small_count = save(small_id, [1, 2])
+    data, large_count = save(large_id, range(1, 13))
+    assert large_count == small_count
+    assert len(data['monthly_tasks']) == 12
+    assert all(t['id'] and t['status'] == "作業中" for t in data['monthly_tasks'])
+
+    # Saving again updates the same rows in place
+    data, update_count = save(large_id, range(1, 13))
+    assert len(data['monthly_tasks']) == 12
+    assert update_count <= large_count + 1
+
+def test_get_clients_filters(client):
+    """Test server-side filtering of the client list"""
+    import random
+    client_id = random.randint(60000, 69999)
+    staff_id = _create_staff_and_client(client, client_id, accounting_method="自計")
+
+    rv = client.get(f'/api/clients?staff_id={staff_id}&accounting_method=自計&is_inactive=false')
+    data = json.loads(rv.data)
+    assert [c['id'] for c in data] == [client_id]
+
+    rv = client.get(f'/api/clients?staff_id={staff_id}&is_inactive=true')
+    assert json.loads(rv.data) == []
+
+    rv = client.get('/api/clients?fiscal_month=13')
+    assert rv.status_code == 400
+
+def test_get_clients_keyset_pagination(client):
+    """Test walking the client list page by page returns every client once, in order"""
+    import random
+    for _ in range(5):
+        _create_staff_and_client(client, random.randint(70000, 79999))
+
+    expected = [c['id'] for c in json.loads(client.get('/api/clients?sort=staff_name&order=desc').data)]
+
+    seen = []
+    url = '/api/clients?sort=staff_name&order=desc&limit=2'
+    while True:
+        page = json.loads(client.get(url).data)
+        assert len(page['clients']) <= 2
+        seen.extend(c['id'] for c in page['clients'])
+        if not page['next_cursor']:
+            break
+        url = f"/api/clients?sort=staff_name&order=desc&limit=2&cursor={page['next_cursor']}"
+    assert seen == expected
+
+    assert client.get('/api/clients?sort=unknown').status_code == 400
+
+def test_conditional_get_returns_304(client):
+    """Test list and detail endpoints answer If-None-Match with 304 until data changes"""
+    import random
+    client_id = random.randint(80000, 89999)
+    _create_staff_and_client(client, client_id)
+
+    for url in ['/api/clients', f'/api/clients/{client_id}', '/api/staffs',
+                '/api/settings', '/api/default-tasks']:
+        rv = client.get(url)
+        assert rv.status_code == 200 and rv.get_data()
+        etag = rv.headers['ETag']
+        rv = client.get(url, headers={'If-None-Match': etag})
+        assert rv.status_code == 304
+        assert rv.data == b''
+
+    etag = client.get(f'/api/clients/{client_id}').headers['ETag']
+    client.put(f'/api/clients/{client_id}',
+               data=json.dumps({"name": "変更後"}),
+               content_type='application/json')
+    rv = client.get(f'/api/clients/{client_id}', headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    assert json.loads(rv.data)['name'] == "変更後"
+
+    # A write that leaves max(updated_at) alone (e.g. stamped at transaction start) still changes the list ETag
+    from app import Client
+    etag = client.get('/api/clients').headers['ETag']
+    with app.app_context():
+        db.session.execute(db.update(Client).where(Client.id == client_id).values(
+            name="遅れた書き込み", version=Client.version + 1, updated_at=Client.updated_at))
+        db.session.commit()
+    rv = client.get('/api/clients', headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    assert next(c for c in json.loads(rv.data) if c['id'] == client_id)['name'] == "遅れた書き込み"
+
+def test_get_clients_streams_json_array(client):
+    """Test the unpaginated client list is streamed as a valid JSON array"""
+    import random
+    from app import Client, stream_json_array
+    client_id = random.randint(90000, 99999)
+    _create_staff_and_client(client, client_id)
+    _create_staff_and_client(client, client_id + 1)
+
+    rv = client.get('/api/clients')
+    assert rv.is_streamed
+    assert rv.mimetype == 'application/json'
+    data = json.loads(rv.data)
+    assert client_id in [c['id'] for c in data]
+
+    # Chunk boundaries must not break the array
+    with app.test_request_context():
+        streamed = stream_json_array(Client.query.order_by(Client.id), Client.to_dict, chunk_size=1)
+        assert [c['id'] for c in json.loads(streamed.get_data())] == [c['id'] for c in data]
+        empty = stream_json_array(Client.query.filter(Client.id < 0), Client.to_dict)
+        assert json.loads(empty.get_data()) == []
+
+def test_client_changes_since_token(client):
+    """Test the delta feed reports updated clients and tombstones for deleted ones"""
+    import random
+    updated_id = random.randint(100000, 109999)
+    deleted_id = updated_id + 1
+    _create_staff_and_client(client, updated_id)
+    _create_staff_and_client(client, deleted_id)
+
+    rv = client.get('/api/clients/changes')
+    initial = json.loads(rv.data)
+    assert updated_id in [c['id'] for c in initial['clients']]
+    assert initial['deleted'] == []
+
+    client.put(f'/api/clients/{updated_id}',
+               data=json.dumps({"name": "差分更新"}),
+               content_type='application/json')
+    client.delete(f'/api/clients/{deleted_id}')
+
+    rv = client.get('/api/clients/changes', query_string={'since': initial['token']})
+    changes = json.loads(rv.data)
+    changed = {c['id']: c for c in changes['clients']}
+    assert changed[updated_id]['name'] == "差分更新"
+    assert deleted_id not in changed
+    assert deleted_id in changes['deleted']
+    assert changes['token']
+
+    # The full list hands out a token to continue from
+    list_token = client.get('/api/clients').headers['X-Changes-Token']
+    client.put(f'/api/clients/{updated_id}', data=json.dumps({"name": "再更新"}), content_type='application/json')
+    changes = json.loads(client.get('/api/clients/changes', query_string={'since': list_token}).data)
+    assert {c['id']: c['name'] for c in changes['clients']}[updated_id] == "再更新"
+
+    assert client.get('/api/clients/changes?since=garbage').status_code == 400
+
+def test_deleted_client_tombstones_are_pruned(client):
+    """Test old tombstones are pruned and tokens older than the retention ask for a resync"""
+    from datetime import timedelta
+    from app import DeletedClient, DELETED_CLIENT_RETENTION
+    with app.app_context():
+        now = db.session.query(db.func.now()).scalar()
+        db.session.add_all([
+            DeletedClient(client_id=990001, deleted_at=now - DELETED_CLIENT_RETENTION - timedelta(days=1)),
+            DeletedClient(client_id=990002, deleted_at=now),
+        ])
+        db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['prune-deleted-clients'])
+    assert "Removed 1 deleted-client tombstones" in result.output
+    with app.app_context():
+        remaining = {row.client_id for row in DeletedClient.query.filter(DeletedClient.client_id > 990000)}
+    assert remaining == {990002}
+
+    stale = (now - DELETED_CLIENT_RETENTION - timedelta(hours=1)).isoformat()
+    rv = client.get('/api/clients/changes', query_string={'since': stale})
+    assert rv.status_code == 410
+    assert json.loads(rv.data)['resync'] is True
+    recent = (now - DELETED_CLIENT_RETENTION + timedelta(hours=1)).isoformat()
+    rv = client.get('/api/clients/changes', query_string={'since': recent})
+    assert rv.status_code == 200
+    assert 990002 in json.loads(rv.data)['deleted']
+
+def test_reference_cache_invalidated_across_workers(client):
+    """Test cached settings are reloaded when another worker bumps the shared version"""
+    from app import Setting, CacheVersion
+
+    client.put('/api/settings',
+               data=json.dumps({"cache_probe": 1}),
+               content_type='application/json')
+    assert json.loads(client.get('/api/settings').data)['cache_probe'] == 1
+
+    # Another worker writes directly; until it bumps the version our cache is authoritative
+    with app.app_context():
+        Setting.query.filter_by(key='cache_probe').first().value = 2
+        db.session.commit()
+    assert json.loads(client.get('/api/settings').data)['cache_probe'] == 1
+
+    with app.app_context():
+        db.session.execute(db.update(CacheVersion)
+                           .where(CacheVersion.name == 'settings')
+                           .values(version=CacheVersion.version + 1))
+        db.session.commit()
+    assert json.loads(client.get('/api/settings').data)['cache_probe'] == 2
+
+def test_benchmark_covers_every_route(client):
+    """Test the benchmark suite has a request spec for every registered endpoint"""
+    from benchmark import RouteBench, uncovered_endpoints
+    bench = RouteBench(app, db, [1])
+    assert uncovered_endpoints(app, bench.specs()) == []
+
+def test_seed_bulk_command(client):
+    """Test bulk seeding creates the requested volume reproducibly"""
+    result = app.test_cli_runner().invoke(args=[
+        'seed-bulk', '--clients', '3', '--staffs', '1', '--years', '1',
+        '--fill-ratio', '1.0', '--seed', '7'
+    ])
+    assert result.exit_code == 0
+    assert "3 clients and 36 monthly tasks" in result.output
+    # Seeded staff ids come from the database, so ordinary inserts still get fresh ids
+    import random
+    rv = client.post('/api/staffs', data=json.dumps({"name": f"シード後{random.randint(100000, 999999)}"}),
+                     content_type='application/json')
+    assert rv.status_code == 201
+
+def test_patch_single_monthly_task(client):
+    """Test PATCHing one month's checkboxes only touches that month"""
+    import random
+    client_id = random.randint(110000, 119999)
+    _create_staff_and_client(client, client_id)
+    version = json.loads(client.get(f'/api/clients/{client_id}').data)['version']
+
+    rv = client.patch(f'/api/clients/{client_id}/monthly-tasks/2025-04',
+                      data=json.dumps({"tasks": {"受付": True}, "memo": "初回"}),
+                      content_type='application/json')
+    assert rv.status_code == 200
+    body = json.loads(rv.data)
+    assert body['monthly_task']['month'] == "2025年4月"
+    assert body['monthly_task']['tasks'] == {"受付": {"checked": True, "note": ""}}
+    assert body['client_updated_at']
+    # The returned client version is the one a following full save must send
+    assert body['version'] == version + 1
+    rv = client.put(f'/api/clients/{client_id}', data=json.dumps({"version": body['version']}),
+                    content_type='application/json')
+    assert rv.status_code == 200
+
+    rv = client.patch(f'/api/clients/{client_id}/monthly-tasks/202504',
+                      data=json.dumps({"tasks": {"入力完了": {"checked": True, "note": "済"}},
+                                       "status": "月次完了"}),
+                      content_type='application/json')
+    task = json.loads(rv.data)['monthly_task']
+    assert task['tasks']["受付"]['checked'] is True
+    assert task['tasks']["入力完了"] == {"checked": True, "note": "済"}
+    assert task['memo'] == "初回"
+
+    details = json.loads(client.get(f'/api/clients/{client_id}').data)
+    assert len(details['monthly_tasks']) == 1
+    row = next(c for c in json.loads(client.get('/api/clients').data) if c['id'] == client_id)
+    assert row['monthlyProgress'] == "2025年4月"
+
+    rv = client.patch(f'/api/clients/{client_id}/monthly-tasks/bad',
+                      data=json.dumps({"memo": "x"}), content_type='application/json')
+    assert rv.status_code == 400
+    for body in (["受付"], {"tasks": ["受付"]}, {"tasks": {"受付": "yes"}},
+                 {"tasks": {"受付": {"checked": 1}}}, {"tasks": {"受付": {"note": 5}}}):
+        rv = client.patch(f'/api/clients/{client_id}/monthly-tasks/2025-04',
+                          data=json.dumps(body), content_type='application/json')
+        assert rv.status_code == 400
+    rv = client.patch('/api/clients/999999/monthly-tasks/2025-04',
+                      data=json.dumps({"memo": "x"}), content_type='application/json')
+    assert rv.status_code == 404
+
+def test_patch_monthly_task_over_legacy_booleans(client):
+    """Test PATCHing a month whose tasks were stored as bare booleans"""
+    import random
+    from app import MonthlyTask
+    client_id = random.randint(110000, 119999)
+    _create_staff_and_client(client, client_id)
+    client.patch(f'/api/clients/{client_id}/monthly-tasks/2025-05',
+                 data=json.dumps({"memo": "旧形式"}), content_type='application/json')
+    with app.app_context():
+        month = MonthlyTask.query.filter_by(client_id=client_id, year_month=202505).one()
+        month.tasks = {"受付": True, "入力完了": False}
+        db.session.commit()
+
+    rv = client.patch(f'/api/clients/{client_id}/monthly-tasks/2025-05',
+                      data=json.dumps({"tasks": {"受付": {"note": "確認済"}, "入力完了": True}}),
+                      content_type='application/json')
+    assert rv.status_code == 200
+    assert json.loads(rv.data)['monthly_task']['tasks'] == {"受付": {"checked": True, "note": "確認済"},
+                                                            "入力完了": {"checked": True, "note": ""}}
+
+def test_stale_version_is_rejected(client):
+    """Test writes based on an out-of-date read fail with 409 instead of overwriting"""
+    import random
+    client_id = random.randint(120000, 129999)
+    _create_staff_and_client(client, client_id)
+
+    details = json.loads(client.get(f'/api/clients/{client_id}').data)
+    stale = dict(details)
+    rv = client.put(f'/api/clients/{client_id}',
+                    data=json.dumps({**details, "name": "First", "monthly_tasks": [
+                        {"month": "2025年4月", "memo": "a"}
+                    ]}),
+                    content_type='application/json')
+    assert rv.status_code == 200
+    saved = json.loads(rv.data)
+    assert saved['version'] == details['version'] + 1
+
+    rv = client.put(f'/api/clients/{client_id}',
+                    data=json.dumps({**stale, "name": "Second"}),
+                    content_type='application/json')
+    assert rv.status_code == 409
+    assert json.loads(client.get(f'/api/clients/{client_id}').data)['name'] == "First"
+
+    # Month versions are checked on PUT and PATCH alike
+    month = saved['monthly_tasks'][0]
+    rv = client.patch(f'/api/clients/{client_id}/monthly-tasks/2025-04',
+                      data=json.dumps({"memo": "b", "version": month['version']}),
+                      content_type='application/json')
+    assert rv.status_code == 200
+    assert json.loads(rv.data)['monthly_task']['version'] == month['version'] + 1
+    rv = client.put(f'/api/clients/{client_id}',
+                    data=json.dumps({"monthly_tasks": [{**month, "memo": "c"}]}),
+                    content_type='application/json')
+    assert rv.status_code == 409
+    rv = client.patch(f'/api/clients/{client_id}/monthly-tasks/2025-04',
+                      data=json.dumps({"memo": "c", "version": month['version']}),
+                      content_type='application/json')
+    assert rv.status_code == 409
+
+    rv = client.put(f'/api/clients/{client_id}/set-inactive',
+                    data=json.dumps({"version": details['version']}),
+                    content_type='application/json')
+    assert rv.status_code == 409
+    rv = client.put(f'/api/clients/{client_id}/set-inactive')
+    assert rv.status_code == 200
+
+    # A malformed version is a bad request, not a conflict or a server error
+    current = json.loads(client.get(f'/api/clients/{client_id}').data)['version']
+    for version in ("abc", 1.5, True, [1]):
+        rv = client.put(f'/api/clients/{client_id}',
+                        data=json.dumps({"name": "Third", "version": version}),
+                        content_type='application/json')
+        assert rv.status_code == 400
+    rv = client.patch(f'/api/clients/{client_id}/monthly-tasks/2025-04',
+                      data=json.dumps({"memo": "d", "version": "v2"}),
+                      content_type='application/json')
+    assert rv.status_code == 400
+    rv = client.put(f'/api/clients/{client_id}',
+                    data=json.dumps({"name": "Third", "version": str(current)}),
+                    content_type='application/json')
+    assert rv.status_code == 200
+
+def test_bulk_update_clients(client):
+    """Test reassigning and deactivating many clients in one request"""
+    import random
+    ids = random.sample(range(130000, 139999), 3)
+    old_staff = _create_staff_and_client(client, ids[0])
+    for client_id in ids[1:]:
+        client.post('/api/clients',
+                    data=json.dumps({"id": client_id, "name": "一括", "fiscal_month": 3,
+                                     "staff_id": old_staff, "accounting_method": "記帳代行"}),
+                    content_type='application/json')
+    new_staff = json.loads(client.post('/api/staffs',
+                                       data=json.dumps({"name": f"後任{random.randint(100000, 999999)}"}),
+                                       content_type='application/json').data)['id']
+    before = json.loads(client.get(f'/api/clients/{ids[0]}').data)['version']
+
+    rv = client.post('/api/clients/bulk',
+                     data=json.dumps({"filter": {"staff_id": old_staff}, "patch": {"staff_id": new_staff}}),
+                     content_type='application/json')
+    assert rv.status_code == 200
+    assert json.loads(rv.data) == {"matched": 3, "updated": 3}
+    details = json.loads(client.get(f'/api/clients/{ids[0]}').data)
+    assert details['staff_id'] == new_staff
+    assert details['version'] == before + 1
+
+    rv = client.post('/api/clients/bulk',
+                     data=json.dumps({"ids": ids[:2], "patch": {"is_inactive": True, "staff_id": new_staff}}),
+                     content_type='application/json')
+    assert json.loads(rv.data) == {"matched": 2, "updated": 2}
+    rv = client.post('/api/clients/bulk',
+                     data=json.dumps({"ids": ids, "patch": {"is_inactive": True}}),
+                     content_type='application/json')
+    assert json.loads(rv.data) == {"matched": 3, "updated": 1}
+
+    for body in ({"ids": ids, "patch": {"name": "x"}},
+                 {"ids": ids, "filter": {}, "patch": {"status": "完了"}},
+                 {"ids": ids, "patch": {"staff_id": 999999}},
+                 {"filter": {"fiscal_month": 13}, "patch": {"status": "完了"}}):
+        rv = client.post('/api/clients/bulk', data=json.dumps(body), content_type='application/json')
+        assert rv.status_code == 400
+
+    # A filter that selects nothing specific must not touch every client
+    versions = [json.loads(client.get(f'/api/clients/{i}').data)['version'] for i in ids]
+    for criteria in ({}, {"staff_idd": new_staff}, {"status": ""}):
+        rv = client.post('/api/clients/bulk',
+                         data=json.dumps({"filter": criteria, "patch": {"status": "完了"}}),
+                         content_type='application/json')
+        assert rv.status_code == 400
+    assert [json.loads(client.get(f'/api/clients/{i}').data)['version'] for i in ids] == versions
+    assert all(json.loads(client.get(f'/api/clients/{i}').data)['status'] != "完了" for i in ids)
+
+def test_month_close_for_many_clients(client):
+    """Test checking a task and closing a month across clients in bulk"""
+    import random
+    ids = random.sample(range(140000, 149999), 2)
+    staff_id = _create_staff_and_client(client, ids[0])
+    client.post('/api/clients',
+                data=json.dumps({"id": ids[1], "name": "締め", "fiscal_month": 3,
+                                 "staff_id": staff_id, "accounting_method": "記帳代行"}),
+                content_type='application/json')
+    client.patch(f'/api/clients/{ids[0]}/monthly-tasks/2025-05',
+                 data=json.dumps({"tasks": {"受付": {"checked": False, "note": "メモ"}, "入力完了": True}}),
+                 content_type='application/json')
+
+    rv = client.post('/api/clients/month-close',
+                     data=json.dumps({"year_month": "2025-05", "filter": {"staff_id": staff_id},
+                                      "tasks": ["受付", "担当チェック"]}),
+                     content_type='application/json')
+    assert rv.status_code == 200
+    assert json.loads(rv.data) == {"created": 1, "updated": 2}
+
+    first = json.loads(client.get(f'/api/clients/{ids[0]}').data)['monthly_tasks'][0]
+    assert first['tasks'] == {"受付": {"checked": True, "note": "メモ"},
+                              "入力完了": {"checked": True, "note": ""},
+                              "担当チェック": {"checked": True, "note": ""}}
+    second = json.loads(client.get(f'/api/clients/{ids[1]}').data)['monthly_tasks'][0]
+    assert second['month'] == "2025年5月"
+    assert second['tasks']["担当チェック"] == {"checked": True, "note": ""}
+
+    result = app.test_cli_runner().invoke(args=['close-month', '2025-05', '--client-id', str(ids[1])])
+    assert "0 month rows created, 1 updated" in result.output
+    rows = {c['id']: c for c in json.loads(client.get('/api/clients').data)}
+    assert rows[ids[1]]['monthlyProgress'] == "2025年5月"
+    assert rows[ids[0]]['monthlyProgress'] == "未完了"
+
+    rv = client.post('/api/clients/month-close',
+                     data=json.dumps({"year_month": "2025-13", "ids": ids}),
+                     content_type='application/json')
+    assert rv.status_code == 400
+    rv = client.post('/api/clients/month-close',
+                     data=json.dumps({"year_month": "2025-06", "filter": {"staff": staff_id}}),
+                     content_type='application/json')
+    assert rv.status_code == 400
+    assert "staff" in json.loads(rv.data)['error']
+
+def test_rollout_default_tasks(client):
+    """Test pushing a checklist to existing clients, skipping finalized years"""
+    import random
+    finalized_id, open_id = random.sample(range(150000, 159999), 2)
+    _create_staff_and_client(client, finalized_id, accounting_method="自計")
+    _create_staff_and_client(client, open_id, accounting_method="自計")
+    client.put(f'/api/clients/{finalized_id}',
+               data=json.dumps({"finalized_years": ["2031"]}),
+               content_type='application/json')
+    tasks = ["受領", f"新項目{random.randint(1000, 9999)}"]
+    body = {"accounting_method": "自計", "years": ["2031", "2032"], "tasks": tasks}
+
+    rv = client.post('/api/default-tasks/rollout', data=json.dumps({**body, "dry_run": True}),
+                     content_type='application/json')
+    preview = json.loads(rv.data)
+    assert preview['dry_run'] is True
+    assert preview['years']["2032"] - preview['years']["2031"] == 1
+    assert "2032" not in json.loads(client.get(f'/api/clients/{open_id}').data)['custom_tasks_by_year']
+
+    result = json.loads(client.post('/api/default-tasks/rollout', data=json.dumps(body),
+                                    content_type='application/json').data)
+    assert (result['clients'], result['years']) == (preview['clients'], preview['years'])
+    finalized = json.loads(client.get(f'/api/clients/{finalized_id}').data)['custom_tasks_by_year']
+    assert finalized.get("2031") != tasks and finalized["2032"] == tasks
+    opened = json.loads(client.get(f'/api/clients/{open_id}').data)['custom_tasks_by_year']
+    assert opened["2031"] == tasks and opened["2032"] == tasks
+
+    again = json.loads(client.post('/api/default-tasks/rollout', data=json.dumps({**body, "dry_run": True}),
+                                   content_type='application/json').data)
+    assert again['clients'] == 0
+
+def test_cleanup_and_retire_tasks(client):
+    """Test removing task names from monthly history per client and office-wide"""
+    import random
+    client_id, other_id = random.sample(range(160000, 169999), 2)
+    _create_staff_and_client(client, client_id)
+    _create_staff_and_client(client, other_id)
+    retired = f"廃止{random.randint(1000, 9999)}"
+    for target in (client_id, other_id):
+        for month in ("2025-06", "2025-07"):
+            client.patch(f'/api/clients/{target}/monthly-tasks/{month}',
+                         data=json.dumps({"tasks": {"受付": True, "旧項目": True, retired: True}}),
+                         content_type='application/json')
+    client.patch(f'/api/clients/{client_id}/monthly-tasks/2025-08',
+                 data=json.dumps({"tasks": {"受付": True}}), content_type='application/json')
+
+    rv = client.post(f'/api/clients/{client_id}/cleanup-deleted-tasks',
+                     data=json.dumps({"year": "2025", "deleted_tasks": ["旧項目"]}),
+                     content_type='application/json')
+    body = json.loads(rv.data)
+    assert rv.status_code == 200
+    assert len(body['monthly_task_versions']) == 2
+    months = json.loads(client.get(f'/api/clients/{client_id}').data)['monthly_tasks']
+    assert [sorted(m['tasks']) for m in months] == [sorted(["受付", retired])] * 2 + [["受付"]]
+    assert {m['id']: m['version'] for m in months if m['month'] != "2025年8月"} == \
+        {int(k): v for k, v in body['monthly_task_versions'].items()}
+
+    rv = client.post('/api/tasks/retire', data=json.dumps({"tasks": [retired]}),
+                     content_type='application/json')
+    assert json.loads(rv.data)['updated'] == 4
+    for target in (client_id, other_id):
+        months = json.loads(client.get(f'/api/clients/{target}').data)['monthly_tasks']
+        assert all(retired not in m['tasks'] for m in months)
+    other = json.loads(client.get(f'/api/clients/{other_id}').data)['monthly_tasks']
+    assert all("旧項目" in m['tasks'] for m in other)
+
+def test_get_clients_by_task(client):
+    """Test listing clients by whether a task is checked for a month"""
+    import random
+    done_id, open_id, legacy_id, missing_id = random.sample(range(170000, 179999), 4)
+    staff_id = _create_staff_and_client(client, done_id)
+    for client_id in (open_id, legacy_id, missing_id):
+        client.post('/api/clients',
+                    data=json.dumps({"id": client_id, "name": "検索", "fiscal_month": 3,
+                                     "staff_id": staff_id, "accounting_method": "記帳代行"}),
+                    content_type='application/json')
+    states = {done_id: {"担当チェック": {"checked": True, "note": ""}},
+              open_id: {"担当チェック": {"checked": False, "note": "確認中"}},
+              legacy_id: {"担当チェック": True}}
+    for client_id, tasks in states.items():
+        client.put(f'/api/clients/{client_id}',
+                   data=json.dumps({"monthly_tasks": [{"month": "2025年5月", "tasks": tasks}]}),
+                   content_type='application/json')
+
+    def ids(**params):
+        rv = client.get('/api/clients/by-task', query_string={
+            "task": "担当チェック", "year_month": "2025-05", "staff_id": staff_id, **params})
+        assert rv.status_code == 200
+        return [c['id'] for c in json.loads(rv.data)]
+
+    assert ids() == sorted([open_id, missing_id])
+    assert ids(done="true") == sorted([done_id, legacy_id])
+    assert client.get('/api/clients/by-task?task=担当チェック').status_code == 400
+
+def test_task_status_table_mode(client, monkeypatch):
+    """Test the normalized task_statuses storage: backfill, dual writes and table reads"""
+    import random
+    import app as backend
+    from app import TaskStatus
+    from sqlalchemy import event
+    client_id = random.randint(180000, 189999)
+    _create_staff_and_client(client, client_id)
+    client.put(f'/api/clients/{client_id}',
+               data=json.dumps({"monthly_tasks": [{"month": "2025年6月", "tasks": {
+                   "受付": {"checked": True, "note": "済"}, "担当チェック": False}}]}),
+               content_type='application/json')
+
+    result = app.test_cli_runner().invoke(args=['sync-task-statuses'])
+    assert "task status rows" in result.output
+
+    def stored():
+        with app.app_context():
+            return {(r.task_name, r.done, r.note) for r in TaskStatus.query.filter_by(client_id=client_id)}
+
+    assert stored() == {("受付", True, "済"), ("担当チェック", False, "")}
+
+    monkeypatch.setattr(backend, 'TASK_STATUS_STORAGE', 'dual')
+    client.patch(f'/api/clients/{client_id}/monthly-tasks/2025-06',
+                 data=json.dumps({"tasks": {"担当チェック": True}}), content_type='application/json')
+    assert ("担当チェック", True, "") in stored()
+
+    monkeypatch.setattr(backend, 'TASK_STATUS_STORAGE', 'table')
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        rv = client.patch(f'/api/clients/{client_id}/monthly-tasks/2025-06',
+                          data=json.dumps({"tasks": {"入力完了": {"checked": True, "note": "OK"}}}),
+                          content_type='application/json')
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert json.loads(rv.data)['monthly_task']['tasks']["入力完了"] == {"checked": True, "note": "OK"}
+    assert len([s for s in statements if s.startswith("INSERT INTO task_statuses")]) == 1
+    assert not any(s.startswith("UPDATE monthly_tasks SET tasks") for s in statements)
+
+    tasks = json.loads(client.get(f'/api/clients/{client_id}').data)['monthly_tasks'][0]['tasks']
+    assert tasks == {"受付": {"checked": True, "note": "済"}, "担当チェック": {"checked": True, "note": ""},
+                     "入力完了": {"checked": True, "note": "OK"}}
+
+    client.post('/api/clients/month-close',
+                data=json.dumps({"year_month": "2025-06", "ids": [client_id], "tasks": ["不明投げかけ"]}),
+                content_type='application/json')
+    client.post(f'/api/clients/{client_id}/cleanup-deleted-tasks',
+                data=json.dumps({"year": "2025", "deleted_tasks": ["受付"]}),
+                content_type='application/json')
+    assert {name for name, _, _ in stored()} == {"担当チェック", "入力完了", "不明投げかけ"}
+    rv = client.get('/api/clients/by-task', query_string={
+        "task": "不明投げかけ", "year_month": "2025-06", "done": "true"})
+    assert client_id in [c['id'] for c in json.loads(rv.data)]
+
+def test_create_client_idempotency_and_csv_upsert(client):
+    """Test idempotent client creation and the batched CSV import upsert"""
+    import io
+    import random
+    client_id, imported_id = random.sample(range(190000, 199999), 2)
+    staff_id = _create_staff_and_client(client, random.randint(200000, 209999))
+    payload = json.dumps({"id": client_id, "name": "冪等", "fiscal_month": 4,
+                          "staff_id": staff_id, "accounting_method": "自計"})
+    headers = {"Idempotency-Key": f"create-{client_id}"}
+
+    first = client.post('/api/clients', data=payload, content_type='application/json', headers=headers)
+    retry = client.post('/api/clients', data=payload, content_type='application/json', headers=headers)
+    assert first.status_code == 201 and retry.status_code == 200
+    assert json.loads(retry.data) == json.loads(first.data)
+    assert client.post('/api/clients', data=payload, content_type='application/json').status_code == 409
+
+    staff_name = next(s['name'] for s in json.loads(client.get('/api/staffs').data) if s['id'] == staff_id)
+    csv_body = "No.,事業所名,決算月,担当者,経理方式,進捗ステータス,状態\n" + "\n".join([
+        f"{client_id},冪等（更新）,5月,{staff_name},自計,作業中,有効",
+        f"{imported_id},取込,6月,{staff_name},記帳代行,未着手,関与終了",
+        f"abc,不正,6月,{staff_name},記帳代行,未着手,有効",
+    ])
+    rv = client.post('/api/clients/import', data={"file": (io.BytesIO(csv_body.encode('utf-8')), "clients.csv")},
+                     content_type='multipart/form-data')
+    result = json.loads(rv.data)
+    assert (result['added'], result['updated'], len(result['errors'])) == (1, 1, 1)
+
+    updated = json.loads(client.get(f'/api/clients/{client_id}').data)
+    assert (updated['name'], updated['fiscal_month'], updated['version']) == ("冪等（更新）", 5, 2)
+    assert updated['custom_tasks_by_year'] == json.loads(first.data)['custom_tasks_by_year']
+    assert json.loads(client.get(f'/api/clients/{imported_id}').data)['is_inactive'] is True
+
+@pytest.mark.parametrize("store_kind", ["database", "memory", "sqlite"])
+def test_editing_session_stores(client, monkeypatch, tmp_path, store_kind):
+    """Test the editing session flow against each session store backend"""
+    import random
+    import app as backend
+    from datetime import timedelta
+    monkeypatch.setattr(backend, 'EDITING_SESSION_STORE_PATH', str(tmp_path / "sessions.sqlite3"))
+    store = backend.create_editing_session_store(store_kind, ttl=timedelta(minutes=10))
+    assert isinstance(store, backend.EditingSessionStore)
+    with pytest.raises(TypeError):
+        backend.EditingSessionStore(timedelta(minutes=10))
+    monkeypatch.setattr(backend, 'editing_sessions', store)
+    client_id = random.randint(210000, 219999)
+    _create_staff_and_client(client, client_id)
+    url = f'/api/clients/{client_id}/editing-session'
+
+    def call(method, user_id, path=url):
+        rv = getattr(client, method)(path, data=json.dumps({"user_id": user_id}), content_type='application/json')
+        return rv.status_code, json.loads(rv.data)
+
+    assert call('post', "alice")[1]['status'] == "editing_allowed"
+    assert call('post', "alice")[1]['status'] == "editing_allowed"
+    _, other = call('post', "bob")
+    assert (other['status'], other['editor']) == ("editing_by_other", "alice")
+    assert call('put', "alice")[0] == 200
+    assert call('put', "bob")[0] == 404
+    status = json.loads(client.get(f'/api/clients/{client_id}/editing-status').data)
+    assert (status['is_editing'], status['editor']) == (True, "alice")
+    statuses = json.loads(client.get(f'/api/editing-status?client_ids={client_id},0').data)
+    assert statuses[str(client_id)]['editor'] == "alice" and statuses["0"] == {"is_editing": False}
+    assert json.loads(client.get('/api/editing-status').data)[str(client_id)]['is_editing'] is True
+
+    # An expired session no longer blocks others
+    store.ttl = timedelta(seconds=-1)
+    assert json.loads(client.get(f'/api/clients/{client_id}/editing-status').data) == {"is_editing": False}
+    assert call('post', "bob")[1]['status'] == "editing_allowed"
+    store.ttl = timedelta(minutes=10)
+    assert call('post', "alice")[1]['editor'] == "bob"
+
+    call('delete', "bob")
+    assert call('post', "alice")[1]['status'] == "editing_allowed"
+    rv = client.delete(f'{url}/force-unlock')
+    assert json.loads(rv.data)['sessions_removed'] == 1
+    assert json.loads(client.get(f'/api/clients/{client_id}/editing-status').data)['is_editing'] is False
+
+def test_reap_editing_sessions(client, monkeypatch):
+    """Test the expired-session reaper command and background thread"""
+    import random
+    import time
+    import app as backend
+    from datetime import timedelta
+    from app import EditingSession
+    store = backend.create_editing_session_store("database", ttl=timedelta(minutes=10))
+    monkeypatch.setattr(backend, 'editing_sessions', store)
+    client_ids = random.sample(range(220000, 229999), 2)
+    for client_id in client_ids:
+        _create_staff_and_client(client, client_id)
+        client.post(f'/api/clients/{client_id}/editing-session',
+                    data=json.dumps({"user_id": "alice"}), content_type='application/json')
+
+    def remaining():
+        with app.app_context():
+            return EditingSession.query.filter(EditingSession.client_id.in_(client_ids)).count()
+
+    result = app.test_cli_runner().invoke(args=['reap-editing-sessions'])
+    assert "Removed" in result.output and remaining() == 2
+
+    store.ttl = timedelta(seconds=-1)
+    stop = backend.start_editing_session_reaper(0.01)
+    try:
+        for _ in range(200):
+            if remaining() == 0:
+                break
+            time.sleep(0.01)
+    finally:
+        stop.set()
+    assert remaining() == 0
+
+def test_event_stream(client, monkeypatch):
+    """Test that committed writes are pushed to /api/events subscribers"""
+    import random
+    import app as backend
+    monkeypatch.setattr(backend, 'event_broker', backend.InProcessEventBroker())
+    monkeypatch.setattr(backend, 'EVENT_KEEPALIVE_SECONDS', 0.05)
+    client_id, other_id = random.sample(range(230000, 239999), 2)
+    staff_id = _create_staff_and_client(client, client_id)
+    _create_staff_and_client(client, other_id)
+
+    rv = client.get(f'/api/events?client_id={client_id}', buffered=False)
+    assert rv.mimetype == 'text/event-stream'
+    chunks = iter(rv.response)
+    assert next(chunks).startswith(b"retry:")
+
+    def next_event():
+        for chunk in chunks:
+            if chunk.startswith(b"event:"):
+                kind, data = chunk.decode('utf-8').strip().split("\n")
+                return kind[len("event: "):], json.loads(data[len("data: "):])
+
+    client.post(f'/api/clients/{other_id}/editing-session',
+                data=json.dumps({"user_id": "bob"}), content_type='application/json')
+    client.post(f'/api/clients/{client_id}/editing-session',
+                data=json.dumps({"user_id": "alice"}), content_type='application/json')
+    assert next_event() == ("editing_started", {"type": "editing_started", "client_id": client_id, "user_id": "alice"})
+    # A rejected write publishes nothing
+    client.put(f'/api/clients/{client_id}', data=json.dumps({"version": 0}), content_type='application/json')
+    client.put(f'/api/clients/{client_id}/set-inactive')
+    assert next_event()[1] == {"type": "client_updated", "client_id": client_id}
+    client.post('/api/clients/bulk', data=json.dumps({"filter": {"staff_id": staff_id}, "patch": {"status": "作業中"}}),
+                content_type='application/json')
+    assert next_event()[0] == "clients_updated"
+    client.delete(f'/api/clients/{client_id}/editing-session',
+                  data=json.dumps({"user_id": "alice"}), content_type='application/json')
+    assert next_event() == ("editing_ended", {"type": "editing_ended", "client_id": client_id, "user_id": "alice"})
+    rv.close()
+    assert client.get('/api/events?client_id=abc').status_code == 400
+
+def test_event_streams_are_capped_and_time_limited(client, monkeypatch):
+    """Test /api/events refuses streams past the limit and ends each after its lifetime"""
+    import threading
+    import app as backend
+    monkeypatch.setattr(backend, 'event_broker', backend.InProcessEventBroker())
+    monkeypatch.setattr(backend, '_event_stream_slots', threading.BoundedSemaphore(1))
+    monkeypatch.setattr(backend, 'EVENT_KEEPALIVE_SECONDS', 0.05)
+    monkeypatch.setattr(backend, 'EVENT_STREAM_MAX_SECONDS', 0.2)
+
+    rv = client.get('/api/events', buffered=False)
+    refused = client.get('/api/events')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After']
+    chunks = list(rv.response)  # Ends on its own once the lifetime is up
+    assert chunks[0].startswith(b"retry:")
+    rv.close()
+    assert not backend.event_broker._subscriptions
+
+    rv = client.get('/api/events', buffered=False)
+    assert rv.status_code == 200
+    rv.close()
+
+def test_write_lock_modes_and_metrics(client, monkeypatch):
+    """Test configurable client write locks, 423 on contention and the lock-wait metric"""
+    import random
+    import types
+    import app as backend
+    client_id = random.randint(240000, 249999)
+    _create_staff_and_client(client, client_id)
+    before = json.loads(client.get('/api/metrics').data)['lock_waits']
+
+    monkeypatch.setattr(backend, 'WRITE_LOCK_MODE', 'nowait')
+    rv = client.put(f'/api/clients/{client_id}/set-inactive')
+    assert rv.status_code == 200 and rv.headers['Server-Timing'].startswith('lock;dur=')
+    rv = client.patch(f'/api/clients/{client_id}/monthly-tasks/2025-07',
+                      data=json.dumps({"tasks": {"受付": True}}), content_type='application/json')
+    assert rv.status_code == 200
+    after = json.loads(client.get('/api/metrics').data)
+    assert after['write_lock_mode'] == 'nowait'
+    assert after['lock_waits']['acquired'] == before['acquired'] + 2
+
+    # A PostgreSQL lock_not_available error becomes LockUnavailable and a 423
+    driver_error = Exception("canceling statement due to lock timeout")
+    driver_error.pgcode = '55P03'
+    lock_error = types.SimpleNamespace(original_exception=driver_error)
+    with pytest.raises(backend.LockUnavailable):
+        backend.translate_lock_errors(lock_error)
+
+    # Refused like a NOWAIT lock would be: counted, then answered with 423
+    def contended(client_id):
+        backend.record_lock_wait(None)
+        raise backend.LockUnavailable(f"client {client_id} is locked")
+    monkeypatch.setattr(backend, 'lock_client', contended)
+    unavailable = json.loads(client.get('/api/metrics').data)['lock_waits']['unavailable']
+    rv = client.put(f'/api/clients/{client_id}/reactivate')
+    assert rv.status_code == 423 and rv.headers['Retry-After'] == '1'
+    assert json.loads(client.get('/api/metrics').data)['lock_waits']['unavailable'] == unavailable + 1
+
+    # Only the client data writes set lock_timeout; editing-session heartbeats do not
+    timeouts = []
+    monkeypatch.setattr(backend, 'set_lock_timeout', lambda: timeouts.append(True))
+    client.put(f'/api/clients/{client_id}/editing-session',
+               data=json.dumps({"user_id": "alice"}), content_type='application/json')
+    assert timeouts == []
+    client.put(f'/api/clients/{client_id}/reactivate')
+    assert timeouts == [True]
+    # Set-based writes across many clients are bounded the same way
+    client.post('/api/default-tasks/rollout',
+                data=json.dumps({"accounting_method": "記帳代行", "years": ["2025"], "tasks": ["受付"], "dry_run": True}),
+                content_type='application/json')
+    client.post('/api/tasks/retire', data=json.dumps({"tasks": ["存在しない作業"]}), content_type='application/json')
+    assert timeouts == [True, True, True]
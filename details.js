@@ -29,17 +29,29 @@ document.addEventListener('DOMContentLoaded', async () => {
     let isSaving = false;
     let hasConflict = false;
     let hasUnsavedChanges = false;
+    let dirtyMonths = new Set(); // 月次データのみ変更された月 (PATCHで個別保存)
+    let needsFullSave = false; // タスク構成など月以外の変更がある場合は全体をPUT
     let saveStatusTimeout;
 
     // --- Editing Session Variables ---
     let isEditingMode = true; // Default to editing allowed
+    let editingLockEvents = null; // Event stream watched while another user holds the lock
+    let saveRetryTimer = null; // Pending retry after the server answered 423 (locked)
     let currentUserId = null;
     let sessionCheckInterval = null;
 
     // --- State Management ---
-    function setUnsavedChanges(isDirty) {
+    function setUnsavedChanges(isDirty, monthStr = null) {
         hasUnsavedChanges = isDirty;
         saveChangesButton.disabled = !isDirty;
+        if (!isDirty) {
+            dirtyMonths.clear();
+            needsFullSave = false;
+        } else if (monthStr) {
+            dirtyMonths.add(monthStr);
+        } else {
+            needsFullSave = true;
+        }
     }
 
     // --- Editing Session Management ---
@@ -61,6 +73,7 @@ document.addEventListener('DOMContentLoaded', async () => {
                 isEditingMode = false;
                 showEditingByOtherMessage(data.editor, data.started_at);
                 disableEditingInterface();
+                watchEditingLock();
                 return false;
             } else if (data.status === 'editing_allowed') {
                 // We can edit
@@ -116,6 +129,18 @@ document.addEventListener('DOMContentLoaded', async () => {
         }, 5 * 60 * 1000); // 5 minutes
     }
 
+    function watchEditingLock() {
+        // Take over as soon as the other editor leaves instead of waiting for a manual refresh
+        if (!window.EventSource || editingLockEvents) return;
+        editingLockEvents = new EventSource(`${API_BASE_URL}/events?client_id=${clientNo}`);
+        editingLockEvents.addEventListener('editing_ended', async () => {
+            if (await startEditingSession()) {
+                editingLockEvents.close();
+                location.reload(); // Refresh page to enable editing
+            }
+        });
+    }
+
     function showEditingByOtherMessage(editorId, startedAt) {
         // Create and show read-only mode message
         const existingMessage = document.getElementById('editing-by-other-message');
@@ -381,12 +406,66 @@ document.addEventListener('DOMContentLoaded', async () => {
         }
     }
 
+    // 変更された月だけを個別に保存する (クライアント全体を送らない)
+    async function saveDirtyMonths() {
+        for (const monthStr of [...dirtyMonths]) {
+            const monthData = clientDetails.monthly_tasks.find(mt => mt.month === monthStr);
+            if (!monthData) continue;
+            const [year, month] = monthStr.match(/\d+/g);
+            const response = await fetch(`${API_BASE_URL}/clients/${clientNo}/monthly-tasks/${year}-${month.padStart(2, '0')}`, {
+                method: 'PATCH',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    tasks: monthData.tasks,
+                    status: monthData.status,
+                    memo: monthData.memo,
+                    url: monthData.url,
+                    version: monthData.version
+                }),
+            });
+
+            if (response.status === 409) {
+                handleConflict();
+                return;
+            }
+
+            if (response.status === 423) {
+                retrySaveLater(response);
+                return;
+            }
+
+            if (!response.ok) {
+                const errorData = await response.json();
+                throw new Error(errorData.error || `API Error: ${response.statusText}`);
+            }
+
+            const result = await response.json();
+            // Update in place: the checkbox and memo handlers hold on to these task objects
+            const { tasks: savedTasks, ...savedFields } = result.monthly_task;
+            Object.assign(monthData, savedFields);
+            Object.entries(savedTasks).forEach(([taskName, state]) => {
+                Object.assign(findOrCreateTask(monthData, taskName), state);
+            });
+            clientDetails.updated_at = result.client_updated_at;
+            clientDetails.version = result.version;
+            dirtyMonths.delete(monthStr);
+        }
+    }
+
     async function performSave() {
         if (hasConflict || isSaving) return;
         isSaving = true;
         showSaveStatus('saving');
 
         try {
+            if (!needsFullSave && dirtyMonths.size > 0) {
+                await saveDirtyMonths();
+                if (hasConflict || saveRetryTimer) return;
+                setUnsavedChanges(false);
+                showSaveStatus('success');
+                return;
+            }
+
             const response = await fetch(`${API_BASE_URL}/clients/${clientNo}`, {
                 method: 'PUT',
                 headers: { 'Content-Type': 'application/json' },
@@ -394,11 +473,12 @@ document.addEventListener('DOMContentLoaded', async () => {
             });
 
             if (response.status === 409) {
-                hasConflict = true;
-                pageOverlay.textContent = 'データが他のユーザーによって更新されました。ページをリロードしてください。';
-                pageOverlay.style.display = 'flex';
-                alert('データが他のユーザーによって更新されました。意図しない上書きを防ぐため、ページをリロードします。');
-                window.location.reload();
+                handleConflict();
+                return;
+            }
+
+            if (response.status === 423) {
+                retrySaveLater(response);
                 return;
             }
 
@@ -420,6 +500,26 @@ document.addEventListener('DOMContentLoaded', async () => {
         }
     }
 
+    // 別のリクエストが保存中でロックを取れなかった場合 (サーバーが 423 を返す)
+    // 変更は未保存のまま残し、Retry-After 秒後に保存し直す
+    function retrySaveLater(response) {
+        const delaySeconds = parseInt(response.headers.get('Retry-After'), 10) || 1;
+        clearTimeout(saveRetryTimer);
+        saveRetryTimer = setTimeout(() => {
+            saveRetryTimer = null;
+            performSave();
+        }, delaySeconds * 1000);
+    }
+
+    // 他のユーザーが先に保存していた場合 (サーバーが 409 を返す)
+    function handleConflict() {
+        hasConflict = true;
+        pageOverlay.textContent = 'データが他のユーザーによって更新されました。ページをリロードしてください。';
+        pageOverlay.style.display = 'flex';
+        alert('データが他のユーザーによって更新されました。意図しない上書きを防ぐため、ページをリロードします。');
+        window.location.reload();
+    }
+
     function showSaveStatus(status) {
         clearTimeout(saveStatusTimeout);
         saveStatus.classList.remove('success', 'error');
@@ -704,7 +804,7 @@ document.addEventListener('DOMContentLoaded', async () => {
                 });
 
                 updateMonthlyStatus(findOrCreateMonthlyTask(clientDetails, monthStr), allTaskNames);
-                setUnsavedChanges(true);
+                setUnsavedChanges(true, monthStr);
             });
             taskHeaderRow.appendChild(th);
         });
@@ -741,13 +841,13 @@ document.addEventListener('DOMContentLoaded', async () => {
                     taskData.checked = checkbox.checked;
                     updateMonthlyStatus(monthData, allTaskNames);
                     cell.classList.toggle('task-completed', checkbox.checked);
-                    setUnsavedChanges(true);
+                    setUnsavedChanges(true, monthStr);
                 });
 
                 memoTextarea.addEventListener('input', (e) => {
                     if (hasConflict) return;
                     taskData.note = e.target.value;
-                    setUnsavedChanges(true);
+                    setUnsavedChanges(true, monthStr);
                 });
             });
         });
@@ -788,7 +888,7 @@ document.addEventListener('DOMContentLoaded', async () => {
             urlInput.addEventListener('input', (e) => {
                 if (hasConflict) return;
                 monthData.url = e.target.value;
-                setUnsavedChanges(true);
+                setUnsavedChanges(true, monthStr);
             });
             urlCell.appendChild(urlInput);
         });
@@ -807,7 +907,7 @@ document.addEventListener('DOMContentLoaded', async () => {
             memoTextarea.addEventListener('input', (e) => {
                 if (hasConflict) return;
                 monthData.memo = e.target.value;
-                setUnsavedChanges(true);
+                setUnsavedChanges(true, monthStr);
             });
             memoCell.appendChild(memoTextarea);
         });
@@ -886,16 +986,23 @@ document.addEventListener('DOMContentLoaded', async () => {
                 'Content-Type': 'application/json'
             },
             body: JSON.stringify({
-                custom_tasks: customTasks
+                custom_tasks: customTasks,
+                version: clientDetails.version
             })
         });
 
+        if (response.status === 409) {
+            handleConflict();
+        }
+
         if (!response.ok) {
             const error = await response.json();
             throw new Error(error.message || 'Failed to sync custom tasks');
         }
 
-        return response.json();
+        const result = await response.json();
+        clientDetails.version = result.version;
+        return result;
     }
 
     async function checkCustomTasksSync() {
@@ -947,16 +1054,28 @@ document.addEventListener('DOMContentLoaded', async () => {
             },
             body: JSON.stringify({
                 year: year,
-                deleted_tasks: deletedTasks
+                deleted_tasks: deletedTasks,
+                version: clientDetails.version
             })
         });
 
+        if (response.status === 409) {
+            handleConflict();
+        }
+
         if (!response.ok) {
             const error = await response.json();
             throw new Error(error.message || 'Failed to cleanup deleted tasks');
         }
 
-        return response.json();
+        const result = await response.json();
+        clientDetails.version = result.version;
+        clientDetails.monthly_tasks.forEach(mt => {
+            if (mt.id in result.monthly_task_versions) {
+                mt.version = result.monthly_task_versions[mt.id];
+            }
+        });
+        return result;
     }
 
     async function propagateTasksToDatabase(sourceYear, targetYears = []) {
@@ -967,16 +1086,23 @@ document.addEventListener('DOMContentLoaded', async () => {
             },
             body: JSON.stringify({
                 source_year: sourceYear,
-                target_years: targetYears
+                target_years: targetYears,
+                version: clientDetails.version
             })
         });
 
+        if (response.status === 409) {
+            handleConflict();
+        }
+
         if (!response.ok) {
             const error = await response.json();
             throw new Error(error.message || 'Failed to propagate tasks');
         }
 
-        return response.json();
+        const result = await response.json();
+        clientDetails.version = result.version;
+        return result;
     }
 
     // Add accordion management menu to the UI
@@ -33,6 +33,8 @@ document.addEventListener('DOMContentLoaded', async () => {
     const isNewMode = clientId === null;
     let currentClient = null;
     let staffs = [];
+    // Sent with every create attempt from this page so a retried save cannot create the client twice
+    const createRequestKey = window.crypto && crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`;
 
     // --- Initialization ---
     async function initializeApp() {
@@ -226,11 +228,12 @@ document.addEventListener('DOMContentLoaded', async () => {
             if (isNewMode) {
                 response = await fetch(`${API_BASE_URL}/clients`, {
                     method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
+                    headers: { 'Content-Type': 'application/json', 'Idempotency-Key': createRequestKey },
                     body: JSON.stringify(clientData),
                 });
             } else {
                 clientData.updated_at = currentClient.updated_at;
+                clientData.version = currentClient.version;
                 response = await fetch(`${API_BASE_URL}/clients/${clientId}`, {
                     method: 'PUT',
                     headers: { 'Content-Type': 'application/json' },
@@ -316,17 +319,20 @@ document.addEventListener('DOMContentLoaded', async () => {
             if (currentAction === 'inactive') {
                 response = await fetch(`${API_BASE_URL}/clients/${clientId}/set-inactive`, {
                     method: 'PUT',
-                    headers: { 'Content-Type': 'application/json' }
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ version: currentClient.version })
                 });
             } else if (currentAction === 'delete') {
                 response = await fetch(`${API_BASE_URL}/clients/${clientId}`, {
                     method: 'DELETE',
-                    headers: { 'Content-Type': 'application/json' }
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ version: currentClient.version })
                 });
             } else if (currentAction === 'reactivate') {
                 response = await fetch(`${API_BASE_URL}/clients/${clientId}/reactivate`, {
                     method: 'PUT',
-                    headers: { 'Content-Type': 'application/json' }
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ version: currentClient.version })
                 });
             }
             
@@ -56,6 +56,8 @@ document.addEventListener('DOMContentLoaded', () => {
     let defaultTasks = {}; // State for default tasks
     let appSettings = {}; // State for application settings
     let filterState = {}; // フィルター状態を保存
+    let editingStatuses = {}; // client id -> status, for clients currently open on a details page
+    let changesToken = null; // /clients/changes cursor covering everything in `clients`
 
     const API_BASE_URL = Config.getApiBaseUrl();
 
@@ -82,10 +84,11 @@ document.addEventListener('DOMContentLoaded', () => {
         
         try {
             // Fetch data from backend
-            [clients, staffs, appSettings] = await Promise.all([
+            [clients, staffs, appSettings, editingStatuses] = await Promise.all([
                 fetchClients(),
                 fetchStaffs(),
-                fetchSettings()
+                fetchSettings(),
+                fetchEditingStatuses()
             ]);
 
             applyFontFamily(appSettings.font_family); // Apply font family from settings
@@ -94,6 +97,7 @@ document.addEventListener('DOMContentLoaded', () => {
             applyFilterState(); // 保存されたフィルター状態を適用
             renderClients();
             updateSortIcons();
+            subscribeToClientEvents();
         } catch (error) {
             console.error("Error initializing app:", error);
             alert("アプリケーションの初期化に失敗しました。");
@@ -384,6 +388,67 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // --- Live Updates ---
+    function subscribeToClientEvents() {
+        // Other users' edits arrive over one event stream instead of needing a reload
+        if (!window.EventSource) return;
+        let refreshTimer = null;
+        const refresh = () => {
+            // Coalesce bursts (e.g. a bulk update) into a single delta fetch
+            clearTimeout(refreshTimer);
+            refreshTimer = setTimeout(syncClientChanges, 1000);
+        };
+        const events = new EventSource(`${API_BASE_URL}/events`);
+        ['client_created', 'client_updated', 'client_deleted', 'clients_updated'].forEach(type => {
+            events.addEventListener(type, refresh);
+        });
+        events.addEventListener('open', refresh); // Catch up on anything missed while reconnecting
+        events.onerror = () => {
+            // A refused stream (e.g. 503 when the server is at its stream limit) is not retried by the browser
+            if (events.readyState === EventSource.CLOSED) {
+                setTimeout(subscribeToClientEvents, 30000);
+            }
+        };
+        events.addEventListener('editing_started', event => {
+            const data = JSON.parse(event.data);
+            editingStatuses[data.client_id] = { is_editing: true, editor: data.user_id };
+            renderClients();
+        });
+        events.addEventListener('editing_ended', event => {
+            delete editingStatuses[JSON.parse(event.data).client_id];
+            renderClients();
+        });
+    }
+
+    async function syncClientChanges() {
+        // Merge only the clients changed since the last sync instead of reloading the list
+        try {
+            let response = null;
+            if (changesToken) {
+                response = await fetch(`${API_BASE_URL}/clients/changes?since=${encodeURIComponent(changesToken)}`);
+            }
+            if (!response || response.status === 410) {
+                // No token yet, or it is older than the server keeps deletions: reload everything
+                clients = await fetchClients();
+                renderClients();
+                return;
+            }
+            if (!response.ok) return;
+            const changes = await response.json();
+            const removed = new Set(changes.deleted);
+            const changed = new Map(changes.clients.map(c => [c.id, c]));
+            clients = clients
+                .filter(c => !removed.has(c.id))
+                .map(c => changed.get(c.id) || c);
+            const known = new Set(clients.map(c => c.id));
+            clients.push(...changes.clients.filter(c => !known.has(c.id)));
+            changesToken = changes.token;
+            if (removed.size || changed.size) renderClients();
+        } catch (error) {
+            console.error("Failed to sync client changes:", error);
+        }
+    }
+
     // --- Data Fetching Functions ---
     async function fetchClients() {
         try {
@@ -391,6 +456,7 @@ document.addEventListener('DOMContentLoaded', () => {
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
+            changesToken = response.headers.get('X-Changes-Token');
             return await response.json();
         } catch (error) {
             console.error("Failed to fetch clients:", error);
@@ -399,6 +465,17 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    async function fetchEditingStatuses() {
+        // One request for every client being edited; the badges are optional, so failures stay quiet
+        try {
+            const response = await fetch(`${API_BASE_URL}/editing-status`);
+            return response.ok ? await response.json() : {};
+        } catch (error) {
+            console.error("Failed to fetch editing statuses:", error);
+            return {};
+        }
+    }
+
     async function fetchStaffs() {
         try {
             const response = await fetch(`${API_BASE_URL}/staffs`);
@@ -558,6 +635,15 @@ document.addEventListener('DOMContentLoaded', () => {
                 const nameCell = row.cells[1]; // 事業者名のセル
                 nameCell.innerHTML = `<a href="details.html?no=${client.id}" class="client-name-link">${client.name}</a><span class="inactive-badge">関与終了</span>`;
             }
+
+            const editing = editingStatuses[client.id];
+            if (editing && editing.is_editing) {
+                const badge = document.createElement('span');
+                badge.className = 'editing-badge';
+                badge.textContent = '編集中';
+                badge.title = `${editing.editor} が編集中`;
+                row.cells[1].appendChild(badge);
+            }
         });
     }
 